@@ -1,24 +1,51 @@
 """The InPost Air integration."""
 
 from __future__ import annotations
+import asyncio
 from dataclasses import dataclass
+from datetime import timedelta
 import logging
 
-from dacite import from_dict
-from homeassistant.config_entries import ConfigEntry
+from homeassistant.config_entries import ConfigEntry, ConfigEntryState
 from homeassistant.const import Platform
-from homeassistant.core import HomeAssistant
+from homeassistant.core import HomeAssistant, callback
 from homeassistant.exceptions import ConfigEntryNotReady, ConfigEntryError
-from homeassistant.helpers import device_registry as dr
+from homeassistant.helpers import device_registry as dr, entity_registry as er
+from homeassistant.helpers.start import async_at_started
+from homeassistant.util import dt as dt_util
 
-from custom_components.inpost_air.coordinator import InPostAirDataCoordinator
+from custom_components.inpost_air.const import (
+    CONF_LOCKER_ID,
+    CONF_LOCKER_ID_VERIFIED_AT,
+    CONF_SHARED_POLLING,
+    DOMAIN,
+)
+from custom_components.inpost_air.coordinator import (
+    UPDATE_INTERVAL,
+    InPostAirDataCoordinator,
+    async_get_hub_coordinator,
+    create_snapshot_store,
+)
+from custom_components.inpost_air.decoder import dataclass_decoder
 from custom_components.inpost_air.models import ParcelLocker
 from custom_components.inpost_air.utils import get_device_info, get_parcel_locker_url
 
-from .api import InPostAirPoint, InPostApi
+from .api import (
+    InPostAirApiClientError,
+    InPostAirApiClientSensorsMissingError,
+    InPostAirPoint,
+    async_get_api_client,
+    async_release_api_client,
+)
 
 _LOGGER = logging.getLogger(__name__)
 
+DATA_BLOCKING_SETUP = "blocking_setup"
+# Stored parcel locker IDs are checked on their page after this long
+LOCKER_ID_REVALIDATION_INTERVAL = timedelta(days=7)
+# or when air data disappears, but not more often than this
+LOCKER_ID_MIN_REVALIDATION_INTERVAL = timedelta(hours=1)
+
 
 @dataclass
 class InPostAirData:
@@ -37,7 +64,7 @@ PLATFORMS: list[Platform] = [Platform.SENSOR]
 
 async def async_setup_entry(hass: HomeAssistant, entry: InPostAirConfiEntry) -> bool:
     """Set up InPost Air from a config entry."""
-    api_client = InPostApi(hass)
+    api_client = async_get_api_client(hass)
     entry_data = entry.data.get("parcel_locker")
 
     if (
@@ -45,24 +72,66 @@ async def async_setup_entry(hass: HomeAssistant, entry: InPostAirConfiEntry) ->
         if entry_data is None
         else entry_data
         if isinstance(entry_data, InPostAirPoint)
-        else from_dict(InPostAirPoint, entry_data)
+        else dataclass_decoder(InPostAirPoint)(entry_data)
     ) is None:
         return False
 
-    if (parcel_locker_id := await api_client.find_parcel_locker_id(point)) is None:
-        return False
+    # Entities registered before are set up without waiting for the API,
+    # unless background setup already found the parcel locker unusable
+    blocking_setup = _async_pop_blocking_setup(hass, entry)
+    background_setup = not blocking_setup and bool(
+        er.async_entries_for_config_entry(er.async_get(hass), entry.entry_id)
+    )
+
+    if (parcel_locker_id := entry.data.get(CONF_LOCKER_ID)) is None:
+        if not background_setup and (
+            (parcel_locker_id := await _async_resolve_locker_id(hass, entry, point))
+            is None
+        ):
+            return False
+    elif not _locker_id_verified_within(entry, LOCKER_ID_REVALIDATION_INTERVAL):
 
+        @callback
+        def _async_schedule_revalidation(hass: HomeAssistant) -> None:
+            entry.async_create_background_task(
+                hass,
+                _async_revalidate_locker_id(hass, entry, point),
+                f"{DOMAIN} {point.n} locker ID revalidation",
+            )
+
+        entry.async_on_unload(async_at_started(hass, _async_schedule_revalidation))
+
+    shared_polling = entry.options.get(CONF_SHARED_POLLING, False)
     parcel_locker = ParcelLocker(point.n, parcel_locker_id)
-    coordinator = InPostAirDataCoordinator(hass, api_client, parcel_locker)
+    coordinator = InPostAirDataCoordinator(
+        hass,
+        api_client,
+        parcel_locker,
+        create_snapshot_store(hass, entry.entry_id),
+        None if shared_polling else UPDATE_INTERVAL,
+    )
 
     entry.runtime_data = InPostAirData(parcel_locker, coordinator)
 
-    try:
-        await coordinator.async_config_entry_first_refresh()
-    except ConfigEntryNotReady as ex:
-        if "Air sensors are not available" in str(ex):
-            raise ConfigEntryError(ex)
-        raise ex
+    restored = await coordinator.async_restore_snapshot()
+    if not blocking_setup and (restored or background_setup):
+        if coordinator.data is None:
+            # Entities are unavailable until the first refresh
+            coordinator.last_update_success = False
+        entry.async_create_background_task(
+            hass,
+            _async_finish_setup(hass, entry, point, coordinator),
+            f"{DOMAIN} {parcel_locker.locker_code} first refresh",
+        )
+    else:
+        try:
+            await coordinator.async_config_entry_first_refresh()
+        except ConfigEntryNotReady as ex:
+            if "Air sensors are not available" in str(ex):
+                if await _async_locker_id_changed_after_error(hass, entry, point):
+                    raise ConfigEntryNotReady("Parcel locker ID changed") from ex
+                raise ConfigEntryError(ex)
+            raise ex
 
     device_registry = dr.async_get(hass)
     device_registry.async_get_or_create(
@@ -76,12 +145,162 @@ async def async_setup_entry(hass: HomeAssistant, entry: InPostAirConfiEntry) ->
 
     await hass.config_entries.async_forward_entry_setups(entry, PLATFORMS)
 
+    if shared_polling:
+        entry.async_on_unload(
+            async_get_hub_coordinator(hass).async_add_coordinator(coordinator)
+        )
+    entry.async_on_unload(entry.add_update_listener(_async_update_listener))
+
     return True
 
 
+async def _async_update_listener(
+    hass: HomeAssistant, entry: InPostAirConfiEntry
+) -> None:
+    """Reload entry when polling mode changes, data updates don't need it."""
+    shared_polling = entry.runtime_data.coordinator.update_interval is None
+    if entry.options.get(CONF_SHARED_POLLING, False) != shared_polling:
+        await hass.config_entries.async_reload(entry.entry_id)
+
+
+@callback
+def _async_pop_blocking_setup(hass: HomeAssistant, entry: InPostAirConfiEntry) -> bool:
+    """Check if entry was reloaded to wait for the API during setup, only once."""
+    blocking_setup: set[str] = hass.data.setdefault(DOMAIN, {}).setdefault(
+        DATA_BLOCKING_SETUP, set()
+    )
+    if entry.entry_id in blocking_setup:
+        blocking_setup.discard(entry.entry_id)
+        return True
+    return False
+
+
+@callback
+def _locker_id_verified_within(entry: InPostAirConfiEntry, interval: timedelta) -> bool:
+    """Check if stored parcel locker ID was found on its page recently."""
+    verified_at = entry.data.get(CONF_LOCKER_ID_VERIFIED_AT)
+    return (
+        verified_at is not None
+        and dt_util.utcnow().timestamp() - verified_at < interval.total_seconds()
+    )
+
+
+async def _async_resolve_locker_id(
+    hass: HomeAssistant, entry: InPostAirConfiEntry, point: InPostAirPoint
+) -> str | None:
+    """Find parcel locker ID and store it in the entry."""
+    if (
+        parcel_locker_id := await async_get_api_client(hass).find_parcel_locker_id(
+            point
+        )
+    ) is not None:
+        hass.config_entries.async_update_entry(
+            entry,
+            data={
+                **entry.data,
+                CONF_LOCKER_ID: parcel_locker_id,
+                CONF_LOCKER_ID_VERIFIED_AT: dt_util.utcnow().timestamp(),
+            },
+        )
+    return parcel_locker_id
+
+
+async def _async_finish_setup(
+    hass: HomeAssistant,
+    entry: InPostAirConfiEntry,
+    point: InPostAirPoint,
+    coordinator: InPostAirDataCoordinator,
+) -> None:
+    """
+    Resolve parcel locker ID and fetch first data after setup returned.
+
+    If the parcel locker turns out to be unusable, the entry is reloaded with
+    blocking setup, so it fails the same way it would without background setup.
+    """
+    await asyncio.sleep(coordinator.first_refresh_delay)
+
+    parcel_locker = coordinator.parcel_locker
+    if parcel_locker.locker_id is None:
+        try:
+            parcel_locker.locker_id = await _async_resolve_locker_id(hass, entry, point)
+        except InPostAirApiClientError as ex:
+            _LOGGER.debug("Couldn't find ID of parcel locker %s: %s", point.n, ex)
+        if parcel_locker.locker_id is None:
+            _async_reload_with_blocking_setup(hass, entry)
+            return
+
+    await coordinator.async_refresh()
+    if isinstance(
+        coordinator.last_exception and coordinator.last_exception.__cause__,
+        InPostAirApiClientSensorsMissingError,
+    ):
+        _async_reload_with_blocking_setup(hass, entry)
+
+
+@callback
+def _async_reload_with_blocking_setup(
+    hass: HomeAssistant, entry: InPostAirConfiEntry
+) -> None:
+    """Reload entry waiting for the API during setup."""
+    hass.data.setdefault(DOMAIN, {}).setdefault(DATA_BLOCKING_SETUP, set()).add(
+        entry.entry_id
+    )
+    hass.config_entries.async_schedule_reload(entry.entry_id)
+
+
+async def _async_revalidate_locker_id(
+    hass: HomeAssistant, entry: InPostAirConfiEntry, point: InPostAirPoint
+) -> None:
+    """Check if stored parcel locker ID is still valid, reload entry if it changed."""
+    stored_locker_id = entry.data.get(CONF_LOCKER_ID)
+    try:
+        parcel_locker_id = await _async_resolve_locker_id(hass, entry, point)
+    except InPostAirApiClientError as ex:
+        _LOGGER.debug("Couldn't revalidate ID of parcel locker %s: %s", point.n, ex)
+        return
+
+    if parcel_locker_id is None or parcel_locker_id == stored_locker_id:
+        return
+
+    _LOGGER.info("ID of parcel locker %s changed to %s", point.n, parcel_locker_id)
+    hass.config_entries.async_schedule_reload(entry.entry_id)
+
+
+async def _async_locker_id_changed_after_error(
+    hass: HomeAssistant, entry: InPostAirConfiEntry, point: InPostAirPoint
+) -> bool:
+    """Check if missing air data is caused by a changed parcel locker ID."""
+    stored_locker_id = entry.data.get(CONF_LOCKER_ID)
+    if _locker_id_verified_within(entry, LOCKER_ID_MIN_REVALIDATION_INTERVAL):
+        return False
+
+    try:
+        parcel_locker_id = await _async_resolve_locker_id(hass, entry, point)
+    except InPostAirApiClientError as ex:
+        _LOGGER.debug("Couldn't revalidate ID of parcel locker %s: %s", point.n, ex)
+        return False
+
+    return parcel_locker_id is not None and parcel_locker_id != stored_locker_id
+
+
 async def async_unload_entry(hass: HomeAssistant, entry: InPostAirConfiEntry) -> bool:
     """Unload a config entry."""
-    return await hass.config_entries.async_unload_platforms(entry, PLATFORMS)
+    if not await hass.config_entries.async_unload_platforms(entry, PLATFORMS):
+        return False
+
+    if not any(
+        other.state is ConfigEntryState.LOADED
+        for other in hass.config_entries.async_entries(DOMAIN)
+        if other.entry_id != entry.entry_id
+    ):
+        async_release_api_client(hass)
+
+    return True
+
+
+async def async_remove_entry(hass: HomeAssistant, entry: InPostAirConfiEntry) -> None:
+    """Remove data stored for a config entry."""
+    await create_snapshot_store(hass, entry.entry_id).async_remove()
 
 
 async def async_migrate_entry(hass: HomeAssistant, config_entry: InPostAirConfiEntry):
@@ -97,7 +316,9 @@ async def async_migrate_entry(hass: HomeAssistant, config_entry: InPostAirConfiE
     if config_entry.version == 1:
         hass.config_entries.async_update_entry(
             config_entry,
-            data={"parcel_locker": from_dict(InPostAirPoint, config_entry.data)},
+            data={
+                "parcel_locker": dataclass_decoder(InPostAirPoint)(config_entry.data)
+            },
             version=2,
         )
 
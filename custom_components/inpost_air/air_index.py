@@ -0,0 +1,170 @@
+"""Index of parcel lockers reporting air quality data."""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+from collections.abc import Iterable
+from datetime import timedelta
+from typing import Any
+
+from aiohttp import ClientError
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers.storage import Store
+from homeassistant.util import dt as dt_util
+
+from custom_components.inpost_air.api import (
+    InPostAirApiClientError,
+    InPostAirApiClientSensorsMissingError,
+    InPostApi,
+)
+from custom_components.inpost_air.catalog import CompactCatalog
+from custom_components.inpost_air.const import DOMAIN
+from custom_components.inpost_air.models import InPostAirPoint
+from custom_components.inpost_air.utils import TokenBucket
+
+_LOGGER = logging.getLogger(__name__)
+
+DATA_AIR_INDEX = "air_index"
+STORAGE_KEY = f"{DOMAIN}.air_index"
+STORAGE_VERSION = 1
+STORAGE_SAVE_DELAY = 10
+POSITIVE_TTL = timedelta(days=7)
+NEGATIVE_TTL = timedelta(days=1)
+UNKNOWN_ID_RETRY_DELAY = timedelta(hours=1)
+MAX_CONCURRENT_PROBES = 2
+MAX_PROBES_PER_SECOND = 0.5
+MAX_PROBES_BURST = 2
+MAX_PROBES_PER_BATCH = 20
+
+
+class AirCapabilityIndex:
+    """
+    Remembers which parcel lockers report air quality data.
+
+    Lockers are probed in the background by resolving their ID and reading
+    their air data, at most MAX_CONCURRENT_PROBES at a time and
+    MAX_PROBES_PER_SECOND on top of the API client limits. Lockers with air
+    sensors are remembered for POSITIVE_TTL, the ones without only for
+    NEGATIVE_TTL, as sensors get installed in more lockers over time. Lockers
+    which ID couldn't be found stay unknown, they're probed again after
+    UNKNOWN_ID_RETRY_DELAY.
+    """
+
+    def __init__(self, hass: HomeAssistant) -> None:
+        """Init class."""
+        self.hass = hass
+        self._store: Store[dict[str, Any]] = Store(hass, STORAGE_VERSION, STORAGE_KEY)
+        self._loaded = False
+        # Code -> (has air data, checked at timestamp)
+        self._entries: dict[str, tuple[bool, float]] = {}
+        self._probing: set[str] = set()
+        # Code -> timestamp after which locker without known ID is probed again
+        self._retry_after: dict[str, float] = {}
+        self._semaphore = asyncio.Semaphore(MAX_CONCURRENT_PROBES)
+        self._rate_limiter = TokenBucket(MAX_PROBES_PER_SECOND, MAX_PROBES_BURST)
+
+    async def async_load(self) -> None:
+        """Load the index stored on disk, once."""
+        if self._loaded:
+            return
+        self._loaded = True
+
+        if (stored := await self._store.async_load()) is None:
+            return
+
+        try:
+            self._entries = {
+                code: (bool(has_air_data), float(checked_at))
+                for code, (has_air_data, checked_at) in stored["lockers"].items()
+            }
+        except (KeyError, TypeError, ValueError, AttributeError):
+            _LOGGER.debug("Ignoring invalid air capability index stored on disk")
+
+    def get(self, code: str) -> bool | None:
+        """Get whether the parcel locker has air data, None if unknown or expired."""
+        if (entry := self._entries.get(code)) is None:
+            return None
+
+        has_air_data, checked_at = entry
+        ttl = POSITIVE_TTL if has_air_data else NEGATIVE_TTL
+        if dt_util.utcnow().timestamp() - checked_at >= ttl.total_seconds():
+            return None
+        return has_air_data
+
+    @callback
+    def async_set(self, code: str, has_air_data: bool) -> None:
+        """Record whether the parcel locker has air data."""
+        self._entries[code] = (has_air_data, dt_util.utcnow().timestamp())
+        self._store.async_delay_save(self._data_to_save, STORAGE_SAVE_DELAY)
+
+    @callback
+    def async_probe(
+        self, api_client: InPostApi, catalog: CompactCatalog, codes: Iterable[str]
+    ) -> None:
+        """Probe parcel lockers which aren't known yet in the background."""
+        for code in codes:
+            if len(self._probing) >= MAX_PROBES_PER_BATCH:
+                return
+            if code in self._probing or self.get(code) is not None:
+                continue
+            if self._retry_after.get(code, 0) > dt_util.utcnow().timestamp():
+                continue
+            if (row := catalog.find(code)) is None:
+                continue
+
+            self._probing.add(code)
+            self.hass.async_create_background_task(
+                self._async_probe(api_client, row.to_point()),
+                f"{DOMAIN} probe air data of {code}",
+            )
+
+    async def _async_probe(self, api_client: InPostApi, point: InPostAirPoint) -> None:
+        """Check if the parcel locker has air data."""
+        try:
+            async with self._semaphore:
+                if (delay := self._rate_limiter.reserve()) > 0:
+                    await asyncio.sleep(delay)
+
+                try:
+                    parcel_locker_id = await api_client.find_parcel_locker_id(point)
+                    if parcel_locker_id is None:
+                        # Page without ID doesn't say anything about sensors
+                        self._retry_after[point.n] = (
+                            dt_util.utcnow() + UNKNOWN_ID_RETRY_DELAY
+                        ).timestamp()
+                        return
+                    await api_client.get_parcel_locker_air_data(
+                        point.n, parcel_locker_id
+                    )
+                except InPostAirApiClientSensorsMissingError:
+                    has_air_data = False
+                except (InPostAirApiClientError, ClientError, ValueError) as e:
+                    # Stays unknown, so it's probed again next time. ValueError
+                    # covers malformed air data, ClientError its content type
+                    _LOGGER.debug("Failed to probe parcel locker %s: %s", point.n, e)
+                    return
+                else:
+                    has_air_data = True
+
+                self.async_set(point.n, has_air_data)
+        finally:
+            self._probing.discard(point.n)
+
+    def _data_to_save(self) -> dict[str, Any]:
+        """Get data to store on disk."""
+        return {
+            "lockers": {
+                code: [has_air_data, checked_at]
+                for code, (has_air_data, checked_at) in self._entries.items()
+            }
+        }
+
+
+@callback
+def async_get_air_index(hass: HomeAssistant) -> AirCapabilityIndex:
+    """Get the air capability index shared by all config flows."""
+    domain_data = hass.data.setdefault(DOMAIN, {})
+    if (air_index := domain_data.get(DATA_AIR_INDEX)) is None:
+        air_index = domain_data[DATA_AIR_INDEX] = AirCapabilityIndex(hass)
+    return air_index
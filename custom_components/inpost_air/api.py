@@ -3,23 +3,100 @@
 import asyncio
 from dataclasses import dataclass
 import logging
+import random
 import re
-from aiohttp import ClientResponse, ClientResponseError
-from dacite import from_dict
-from homeassistant.core import HomeAssistant
+from collections.abc import AsyncIterator, Awaitable, Callable, Hashable, Iterator
+from contextlib import aclosing, asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from datetime import timedelta
+from functools import partial
+from http import HTTPStatus
+from typing import Any
+from aiohttp import ClientConnectionError, ClientResponse, ClientResponseError
+from homeassistant.core import HomeAssistant, callback
 from homeassistant.helpers.aiohttp_client import async_create_clientsession
+from yarl import URL
+from custom_components.inpost_air.catalog import (
+    CatalogRow,
+    CompactCatalog,
+    async_get_catalog_cache,
+)
+from custom_components.inpost_air.const import DOMAIN
+from custom_components.inpost_air.decoder import dataclass_decoder
 from custom_components.inpost_air.models import InPostAirPoint
-from custom_components.inpost_air.utils import get_parcel_locker_url
+from custom_components.inpost_air.streaming import (
+    CHUNK_SIZE,
+    JsonArrayItemsParser,
+    async_search_stream,
+)
+from custom_components.inpost_air.utils import (
+    CircuitBreaker,
+    ExpiringLRUCache,
+    TokenBucket,
+    get_parcel_locker_url,
+)
 
 _LOGGER = logging.getLogger(__name__)
 
+PARCEL_LOCKERS_LIST_URL = "https://inpost.pl/sites/default/files/points.json"
+EASYPACK24_POINTS_URL = "https://api-shipx-pl.easypack24.net/v1/points/"
+
+DATA_API_CLIENT = "api_client"
+DATA_EASYPACK24_CACHE = "easypack24_cache"
+EASYPACK24_CACHE_SIZE = 128
+EASYPACK24_CACHE_TTL = timedelta(hours=12).total_seconds()
+EASYPACK24_NEGATIVE_CACHE_TTL = timedelta(minutes=30).total_seconds()
+
+MAX_CONNECTIONS_PER_HOST = 4
+# InPost throttles and blocks IPs sending bursts of requests
+MAX_REQUESTS_PER_SECOND_PER_HOST = 2
+MAX_REQUESTS_BURST_PER_HOST = 4
+
+REQUEST_TIMEOUT = 30
+MAX_RETRIES = 2
+RETRY_BACKOFF = 1
+RETRY_BACKOFF_MAX = 10
+CIRCUIT_BREAKER_THRESHOLD = 5
+CIRCUIT_BREAKER_RESET_TIMEOUT = 60
+
+# How long catalog download gets before easypack24 is asked too
+HEDGE_DELAY = 0.5
+# Amount of points.json passed to the executor for decoding at once
+CATALOG_PARSE_BATCH_SIZE = 1024 * 1024
+
+SHIPX_URL_PATTERN = re.compile(
+    r"data-shipx-url=\"/shipx-point-data/([^/\"]*)/([^/\"]*)/air_index_level\""
+)
+SHIPX_URL_MAX_LENGTH = 512
+
+_MISSING = object()
+
+_deadline: ContextVar[float | None] = ContextVar("inpost_air_deadline", default=None)
 
-@dataclass
-class ParcelLockerListResponse:
-    date: str
-    page: int
-    total_pages: int
-    items: list[InPostAirPoint]
+
+@contextmanager
+def request_deadline(seconds: float) -> Iterator[None]:
+    """
+    Give all requests made within the block one time budget.
+
+    Attempts, their retries and backoff of every request share the budget,
+    nested budgets can only make it shorter.
+    """
+    deadline = asyncio.get_running_loop().time() + seconds
+    if (outer := _deadline.get()) is not None:
+        deadline = min(deadline, outer)
+    token = _deadline.set(deadline)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def _is_transient(err: BaseException) -> bool:
+    """Check if request failed for a reason which may go away on its own."""
+    if isinstance(err, ClientResponseError):
+        return err.status >= 500 or err.status == HTTPStatus.TOO_MANY_REQUESTS
+    return isinstance(err, (TimeoutError, ClientConnectionError))
 
 
 @dataclass
@@ -32,10 +109,90 @@ class ParcelLockerAirDataResponse:
 class InPostApi:
     """Helper functions for the Air integration."""
 
-    def __init__(self, hass: HomeAssistant) -> None:
+    def __init__(self, hass: HomeAssistant, max_retries: int = MAX_RETRIES) -> None:
         """Init class."""
         self.hass = hass
-        self.session = async_create_clientsession(hass)
+        self.max_retries = max_retries
+        self.session = async_create_clientsession(hass, auto_cleanup=False)
+        self._host_semaphores: dict[str, asyncio.Semaphore] = {}
+        self._host_rate_limiters: dict[str, TokenBucket] = {}
+        self._host_circuit_breakers: dict[str, CircuitBreaker] = {}
+        self._in_flight: dict[Hashable, asyncio.Task] = {}
+
+    @callback
+    def async_close(self) -> None:
+        """Release the HTTP session, pooled connections stay with Home Assistant."""
+        self.session.detach()
+
+    def _host_semaphore(self, url: str) -> asyncio.Semaphore:
+        """Get semaphore limiting concurrent requests to the host of given URL."""
+        host = URL(url).host or ""
+        if (semaphore := self._host_semaphores.get(host)) is None:
+            semaphore = self._host_semaphores[host] = asyncio.Semaphore(
+                MAX_CONNECTIONS_PER_HOST
+            )
+        return semaphore
+
+    def _host_rate_limiter(self, url: str) -> TokenBucket:
+        """Get rate limiter of requests to the host of given URL."""
+        host = URL(url).host or ""
+        if (rate_limiter := self._host_rate_limiters.get(host)) is None:
+            rate_limiter = self._host_rate_limiters[host] = TokenBucket(
+                MAX_REQUESTS_PER_SECOND_PER_HOST, MAX_REQUESTS_BURST_PER_HOST
+            )
+        return rate_limiter
+
+    @asynccontextmanager
+    async def _async_host_slot(self, url: str) -> AsyncIterator[None]:
+        """
+        Wait for a rate limit token and a free connection to the URL's host.
+
+        Only the caller's deadline limits the wait. The token is given back
+        if the wait is abandoned, so requests queued on our side don't use
+        up the rate of the ones behind them.
+        """
+        rate_limiter = self._host_rate_limiter(url)
+        semaphore = self._host_semaphore(url)
+        try:
+            async with asyncio.timeout_at(_deadline.get()):
+                if (delay := rate_limiter.reserve()) > 0:
+                    _LOGGER.debug("Delaying request to %s by %.1fs", url, delay)
+                    await asyncio.sleep(delay)
+                await semaphore.acquire()
+        except BaseException:
+            rate_limiter.refund()
+            raise
+
+        try:
+            yield
+        finally:
+            semaphore.release()
+
+    async def _async_single_flight(
+        self, key: Hashable, call: Callable[[], Awaitable[Any]]
+    ) -> Any:
+        """
+        Share one call between concurrent callers with the same key.
+
+        The call runs in its own task, so a cancelled caller doesn't cancel
+        it for the others.
+        """
+        if (task := self._in_flight.get(key)) is None:
+            task = self._in_flight[key] = self.hass.async_create_background_task(
+                call(), f"{DOMAIN} request {key}"
+            )
+
+            def _done(task: asyncio.Task) -> None:
+                del self._in_flight[key]
+                if not task.cancelled():
+                    # Mark exception as retrieved in case all callers were cancelled
+                    task.exception()
+
+            task.add_done_callback(_done)
+        else:
+            _LOGGER.debug("Joining request already in flight: %s", key)
+
+        return await asyncio.shield(task)
 
     async def _request(
         self,
@@ -43,19 +200,31 @@ class InPostApi:
         url: str,
         headers: dict | None = None,
         raise_client_response_error: bool = False,
+        stream: bool = False,
+        idempotent: bool | None = None,
     ) -> ClientResponse:
-        """Get information from the API."""
-        try:
-            async with asyncio.timeout(30):
-                response = await self.session.request(
-                    method=method,
-                    url=url,
-                    headers=headers,
-                )
-                response.raise_for_status()
+        """Get information from the API.
 
-                return response
+        The body is read before returning, so the connection goes back to the
+        pool right away, and identical requests made at the same time share
+        one response. With `stream` the caller has to release the response.
+        Idempotent requests, by default GET ones, are retried on transient
+        errors.
+        """
+        if idempotent is None:
+            idempotent = method.upper() in ("GET", "HEAD")
+        retries = self.max_retries if idempotent else 0
+
+        try:
+            if stream:
+                return await self._fetch(method, url, headers, retries, stream=True)
+            return await self._async_single_flight(
+                (method.lower(), url, frozenset((headers or {}).items())),
+                partial(self._fetch, method, url, headers, retries),
+            )
 
+        except InPostAirApiClientError:
+            raise
         except TimeoutError as e:
             _LOGGER.warning("Request timed out")
             raise InPostAirApiClientError("Request timed out") from e
@@ -68,17 +237,123 @@ class InPostApi:
                 "Something really wrong happened!"
             ) from exception
 
+    async def _fetch(
+        self,
+        method: str,
+        url: str,
+        headers: dict | None,
+        retries: int,
+        stream: bool = False,
+    ) -> ClientResponse:
+        """Send request, retrying transient errors with jittered exponential backoff."""
+        host = URL(url).host or ""
+        if (circuit_breaker := self._host_circuit_breakers.get(host)) is None:
+            circuit_breaker = self._host_circuit_breakers[host] = CircuitBreaker(
+                CIRCUIT_BREAKER_THRESHOLD, CIRCUIT_BREAKER_RESET_TIMEOUT
+            )
+
+        attempt = 0
+        while True:
+            if not circuit_breaker.allow():
+                raise InPostAirApiClientUnavailableError(
+                    f"{host} is unavailable, not sending requests to it for now"
+                )
+            # Waiting for our own limits isn't a failure of the host
+            async with self._async_host_slot(url):
+                try:
+                    response = await self._fetch_once(method, url, headers, stream)
+                except Exception as err:
+                    if not _is_transient(err):
+                        # Host is up, it just didn't like the request
+                        circuit_breaker.record_success()
+                        raise
+                    circuit_breaker.record_failure()
+                    if attempt >= retries or (
+                        (delay := self._retry_delay(attempt)) is None
+                    ):
+                        raise
+                    _LOGGER.debug(
+                        "Retrying %s %s in %.1fs after error: %r",
+                        method,
+                        url,
+                        delay,
+                        err,
+                    )
+                else:
+                    circuit_breaker.record_success()
+                    return response
+
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    def _retry_delay(self, attempt: int) -> float | None:
+        """Get delay before the next attempt, None if it won't fit in the deadline."""
+        delay = min(RETRY_BACKOFF_MAX, RETRY_BACKOFF * 2**attempt)
+        delay *= random.uniform(0.5, 1)
+        if (deadline := _deadline.get()) is not None and (
+            asyncio.get_running_loop().time() + delay >= deadline
+        ):
+            return None
+        return delay
+
+    async def _fetch_once(
+        self, method: str, url: str, headers: dict | None, stream: bool
+    ) -> ClientResponse:
+        """Send request within the time limit."""
+        deadline = asyncio.get_running_loop().time() + REQUEST_TIMEOUT
+        if (budget := _deadline.get()) is not None:
+            deadline = min(deadline, budget)
+
+        async with asyncio.timeout_at(deadline):
+            response = await self.session.request(
+                method=method,
+                url=url,
+                headers=headers,
+            )
+            try:
+                response.raise_for_status()
+                if not stream:
+                    await response.read()
+            except BaseException:
+                response.release()
+                raise
+
+            return response
+
     async def _search_easypack24_locker(
         self, locker_code: str
     ) -> InPostAirPoint | None:
-        """Find info about given parcel locker."""
+        """Find info about given parcel locker, remembering both hits and misses."""
         if not locker_code or locker_code == "":
             return None
 
-        response = await self._request(
-            method="get",
-            url="https://api-shipx-pl.easypack24.net/v1/points/" + locker_code,
+        cache: ExpiringLRUCache = self.hass.data.setdefault(DOMAIN, {}).setdefault(
+            DATA_EASYPACK24_CACHE,
+            ExpiringLRUCache(EASYPACK24_CACHE_SIZE, EASYPACK24_CACHE_TTL),
         )
+        if (cached := cache.get(locker_code, _MISSING)) is not _MISSING:
+            return cached
+
+        parcel_locker = await self._fetch_easypack24_locker(locker_code)
+        cache.set(
+            locker_code,
+            parcel_locker,
+            None if parcel_locker is not None else EASYPACK24_NEGATIVE_CACHE_TTL,
+        )
+        return parcel_locker
+
+    async def _fetch_easypack24_locker(self, locker_code: str) -> InPostAirPoint | None:
+        """Find info about given parcel locker in easypack24.net points API."""
+        try:
+            response = await self._request(
+                method="get",
+                url=EASYPACK24_POINTS_URL + locker_code,
+                raise_client_response_error=True,
+            )
+        except ClientResponseError as e:
+            if e.status == HTTPStatus.NOT_FOUND:
+                return None
+            raise InPostAirApiClientError("Something really wrong happened!") from e
         resp = await response.json()
 
         error = resp.get("error")
@@ -111,47 +386,246 @@ class InPostApi:
         }
         return parcel_locker
 
+    async def get_parcel_lockers_catalog(self) -> CompactCatalog:
+        """Get parcel lockers catalog, revalidating cached copy when it expires."""
+        cache = async_get_catalog_cache(self.hass)
+
+        async with cache.lock:
+            await cache.async_load()
+            if cache.is_fresh:
+                return cache.catalog
+
+            try:
+                response = await self._request(
+                    method="get",
+                    url=PARCEL_LOCKERS_LIST_URL,
+                    headers=cache.conditional_headers(),
+                    stream=True,
+                )
+            except InPostAirApiClientError:
+                if cache.catalog is None:
+                    raise
+                _LOGGER.warning("Couldn't refresh parcel lockers list, using cache")
+                return cache.catalog
+
+            if response.status == HTTPStatus.NOT_MODIFIED:
+                response.release()
+                cache.async_touch()
+                return cache.catalog
+
+            catalog = await self._async_parse_catalog(response)
+            cache.async_update(catalog, response.headers)
+
+            return catalog
+
+    async def _async_parse_catalog(self, response: ClientResponse) -> CompactCatalog:
+        """Decode the whole catalog in the executor while the response arrives."""
+        catalog = CompactCatalog()
+        async with aclosing(
+            self._async_iter_catalog_batches(response, catalog)
+        ) as batches:
+            async for _ in batches:
+                pass
+        return catalog
+
+    async def _async_iter_catalog_batches(
+        self, response: ClientResponse, catalog: CompactCatalog
+    ) -> AsyncIterator[None]:
+        """
+        Decode the catalog in the executor, yielding after each decoded batch.
+
+        Chunks are collected into batches, so the executor isn't called for
+        every chunk. Event loop only passes bytes around.
+        """
+        parser = JsonArrayItemsParser("items")
+        batch: list[bytes] = []
+        batch_size = 0
+        try:
+            async for chunk in response.content.iter_chunked(CHUNK_SIZE):
+                batch.append(chunk)
+                batch_size += len(chunk)
+                if batch_size >= CATALOG_PARSE_BATCH_SIZE:
+                    await self.hass.async_add_executor_job(
+                        _parse_catalog_batch, parser, catalog, batch
+                    )
+                    batch, batch_size = [], 0
+                    if parser.done:
+                        break
+                    yield
+            if not parser.done:
+                await self.hass.async_add_executor_job(
+                    _parse_catalog_batch, parser, catalog, batch
+                )
+        except ValueError as e:
+            raise InPostAirApiClientError("Malformed parcel lockers list") from e
+        finally:
+            # Closes the connection when the body wasn't read till the end
+            response.release()
+
+        if not parser.done:
+            raise InPostAirApiClientError("Malformed parcel lockers list")
+        yield
+
+    async def _has_cached_catalog(self) -> bool:
+        """Check if catalog was downloaded before, even if it needs revalidation."""
+        cache = async_get_catalog_cache(self.hass)
+        async with cache.lock:
+            await cache.async_load()
+            return cache.catalog is not None
+
     async def search_parcel_locker(self, locker_code: str) -> InPostAirPoint | None:
         """Find info about given parcel locker."""
         if not locker_code or locker_code == "":
             return None
 
-        response = await self._request(
-            method="get", url="https://inpost.pl/sites/default/files/points.json"
-        )
-        parcel_locker = next(
-            (
-                x
-                for x in (await response.json()).get("items")
-                if x.get("n") == locker_code
-            ),
-            None,
-        )
+        if await self._has_cached_catalog():
+            # Expired catalog is revalidated, or used as it is if that fails
+            catalog = await self.get_parcel_lockers_catalog()
+            if (row := catalog.find(locker_code)) is not None:
+                return row.to_point()
+            return await self._search_easypack24_point(locker_code)
 
-        if not parcel_locker:
-            parcel_locker = await self._search_easypack24_locker(locker_code)
+        return await self._hedged_search_parcel_locker(locker_code)
 
-        return from_dict(InPostAirPoint, parcel_locker) if parcel_locker else None
+    async def _hedged_search_parcel_locker(
+        self, locker_code: str
+    ) -> InPostAirPoint | None:
+        """
+        Race catalog download against easypack24 points API.
+
+        easypack24 is asked if the catalog doesn't find the locker within
+        HEDGE_DELAY. The first source which finds it wins, the other one is
+        cancelled. Errors are raised only if no source found the locker.
+        """
+        searches = {
+            self.hass.async_create_task(
+                self._search_catalog_stream(locker_code),
+                f"{DOMAIN} {locker_code} catalog search",
+            )
+        }
+        hedged = False
+        error: BaseException | None = None
+        try:
+            while searches:
+                done, searches = await asyncio.wait(
+                    searches,
+                    timeout=None if hedged else HEDGE_DELAY,
+                    return_when=asyncio.FIRST_COMPLETED,
+                )
+                for search in done:
+                    if (search_error := search.exception()) is not None:
+                        error = error or search_error
+                    elif (parcel_locker := search.result()) is not None:
+                        return parcel_locker
+
+                if not hedged:
+                    hedged = True
+                    searches.add(
+                        self.hass.async_create_task(
+                            self._search_easypack24_point(locker_code),
+                            f"{DOMAIN} {locker_code} easypack24 search",
+                        )
+                    )
+        finally:
+            for search in searches:
+                search.cancel()
+
+        if error is not None:
+            raise error
+        return None
+
+    async def _search_catalog_stream(self, locker_code: str) -> InPostAirPoint | None:
+        """
+        Find parcel locker in the catalog, stopping download once it's found.
+
+        The cache is locked while downloading, so concurrent searches wait and
+        use the catalog once it is read whole, instead of downloading it again.
+        """
+        cache = async_get_catalog_cache(self.hass)
+        async with cache.lock:
+            await cache.async_load()
+            if (catalog := cache.catalog) is None:
+                response = await self._request(
+                    method="get", url=PARCEL_LOCKERS_LIST_URL, stream=True
+                )
+                catalog = CompactCatalog()
+                async with aclosing(
+                    self._async_iter_catalog_batches(response, catalog)
+                ) as batches:
+                    async for _ in batches:
+                        # Rows are indexed by code, so it's a lookup, not a scan
+                        if (row := catalog.find(locker_code)) is not None:
+                            return row.to_point()
+
+                # Whole list was read, keep it so it's not downloaded again
+                cache.async_update(catalog, response.headers)
+
+        return None if (row := catalog.find(locker_code)) is None else row.to_point()
+
+    async def _search_easypack24_point(self, locker_code: str) -> InPostAirPoint | None:
+        """Find parcel locker in easypack24 points API."""
+        parcel_locker = await self._search_easypack24_locker(locker_code)
+
+        if not parcel_locker:
+            return None
+        return dataclass_decoder(InPostAirPoint)(parcel_locker)
 
     async def get_parcel_lockers_list(self) -> list[InPostAirPoint]:
         """Get parcel lockers list."""
+        return [row.to_point() for row in await self.get_parcel_lockers_catalog()]
+
+    async def iter_parcel_lockers(
+        self, predicate: Callable[[CatalogRow], bool] | None = None
+    ) -> AsyncIterator[InPostAirPoint]:
+        """
+        Iterate over parcel lockers matching the predicate.
+
+        Without cached catalog, lockers are yielded after each batch decoded
+        in the executor, so they're available before the whole list is read.
+        """
+        if await self._has_cached_catalog():
+            for row in await self.get_parcel_lockers_catalog():
+                if predicate is None or predicate(row):
+                    yield row.to_point()
+            return
+
         response = await self._request(
-            method="get", url="https://inpost.pl/sites/default/files/points.json"
+            method="get", url=PARCEL_LOCKERS_LIST_URL, stream=True
         )
-        response_data = from_dict(ParcelLockerListResponse, await response.json())
+        catalog = CompactCatalog()
+        checked = 0
+        async with aclosing(
+            self._async_iter_catalog_batches(response, catalog)
+        ) as batches:
+            async for _ in batches:
+                for index in range(checked, len(catalog)):
+                    row = catalog[index]
+                    if predicate is None or predicate(row):
+                        yield row.to_point()
+                checked = len(catalog)
 
-        return response_data.items
+        # Whole list was read, keep it so it's not downloaded again
+        async_get_catalog_cache(self.hass).async_update(catalog, response.headers)
 
     async def find_parcel_locker_id(self, point: InPostAirPoint) -> str | None:
-        """Find parcel locker ID by its code."""
-        response = await self._request(
-            method="get",
-            url=get_parcel_locker_url(point),
+        """Find parcel locker ID by its code, sharing concurrent lookups."""
+        return await self._async_single_flight(
+            ("find_parcel_locker_id", point.n),
+            partial(self._find_parcel_locker_id, point),
         )
-        match = re.search(
-            r"data-shipx-url=\"/shipx-point-data/(.*?)/(.*?)/air_index_level\"",
-            await response.text(),
+
+    async def _find_parcel_locker_id(self, point: InPostAirPoint) -> str | None:
+        """Scan parcel locker page for its ID, the only known source of it."""
+        response = await self._request(
+            method="get", url=get_parcel_locker_url(point), stream=True
         )
+        try:
+            match = await async_search_stream(
+                response.content, SHIPX_URL_PATTERN, SHIPX_URL_MAX_LENGTH
+            )
+        finally:
+            # Rest of the page isn't needed, closes the connection if it's not read
+            response.release()
 
         return None if match is None else match.group(1)
 
@@ -165,6 +639,8 @@ class InPostApi:
                 url=f"https://inpost.pl/shipx-point-data/{locker_id}/{locker_code}/air_index_level",
                 headers={"X-Requested-With": "XMLHttpRequest"},
                 raise_client_response_error=True,
+                # Only reads the data
+                idempotent=True,
             )
         except ClientResponseError as e:
             if e.status == 404:
@@ -175,7 +651,35 @@ class InPostApi:
         except:
             raise
 
-        return from_dict(ParcelLockerAirDataResponse, await response.json())
+        return dataclass_decoder(ParcelLockerAirDataResponse)(await response.json())
+
+
+def _parse_catalog_batch(
+    parser: JsonArrayItemsParser, catalog: CompactCatalog, chunks: list[bytes]
+) -> None:
+    """Decode chunks of points.json into the catalog, runs in the executor."""
+    for chunk in chunks:
+        for item in parser.feed(chunk):
+            catalog.date = catalog.date or parser.header.get("date")
+            catalog.append(item)
+        if parser.done:
+            return
+
+
+@callback
+def async_get_api_client(hass: HomeAssistant) -> InPostApi:
+    """Get the API client shared by all config entries and flows."""
+    domain_data = hass.data.setdefault(DOMAIN, {})
+    if (api_client := domain_data.get(DATA_API_CLIENT)) is None:
+        api_client = domain_data[DATA_API_CLIENT] = InPostApi(hass)
+    return api_client
+
+
+@callback
+def async_release_api_client(hass: HomeAssistant) -> None:
+    """Close the shared API client."""
+    if (api_client := hass.data.get(DOMAIN, {}).pop(DATA_API_CLIENT, None)) is not None:
+        api_client.async_close()
 
 
 class InPostAirApiClientError(Exception):
@@ -184,3 +688,7 @@ class InPostAirApiClientError(Exception):
 
 class InPostAirApiClientSensorsMissingError(InPostAirApiClientError):
     """Exception to indicate missing air sensors error"""
+
+
+class InPostAirApiClientUnavailableError(InPostAirApiClientError):
+    """Exception to indicate requests to a host failing fast while it's down"""
@@ -0,0 +1,338 @@
+"""Persistent cache of the InPost parcel lockers catalog."""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+from array import array
+from collections.abc import Iterator, Mapping
+from datetime import timedelta
+from functools import cached_property
+from sys import intern
+from typing import Any
+
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers.storage import Store
+from homeassistant.util import dt as dt_util
+
+from custom_components.inpost_air.const import DOMAIN
+from custom_components.inpost_air.models import (
+    InPostAirPoint,
+    InPostAirPointCoordinates,
+)
+from custom_components.inpost_air.search import SubstringIndex
+from custom_components.inpost_air.spatial import GridIndex
+
+_LOGGER = logging.getLogger(__name__)
+
+DATA_CATALOG = "catalog"
+STORAGE_KEY = f"{DOMAIN}.catalog"
+STORAGE_VERSION = 1
+STORAGE_SAVE_DELAY = 10
+CATALOG_TTL = timedelta(hours=12)
+
+_STRING_FIELDS = ("n", "d", "m", "f", "c", "g", "e", "r", "o", "b", "h", "i")
+_INTEGER_FIELDS = ("t", "p", "s")
+
+
+def _is_coordinate(value: Any) -> bool:
+    """Check if value is a float, or an int JSON number without fraction."""
+    return isinstance(value, float) or type(value) is int
+
+
+class CatalogRow:
+    """
+    Lightweight view on a single row of the catalog.
+    """
+
+    __slots__ = ("_catalog", "index")
+
+    def __init__(self, catalog: CompactCatalog, index: int) -> None:
+        """Init class."""
+        self._catalog = catalog
+        self.index = index
+
+    @property
+    def code(self) -> str:
+        """Parcel locker code."""
+        return self._catalog.codes[self.index]
+
+    @property
+    def description(self) -> str:
+        """Parcel locker location description."""
+        return self._catalog.descriptions[self.index]
+
+    @property
+    def latitude(self) -> float:
+        """Parcel locker latitude."""
+        return self._catalog.latitudes[self.index]
+
+    @property
+    def longitude(self) -> float:
+        """Parcel locker longitude."""
+        return self._catalog.longitudes[self.index]
+
+    def to_point(self) -> InPostAirPoint:
+        """Materialize full parcel locker data."""
+        return self._catalog.to_point(self.index)
+
+
+class CompactCatalog:
+    """
+    Column oriented parcel lockers catalog.
+
+    Strings are interned, so values repeated across lockers (cities, provinces,
+    opening hours) are stored once. Coordinates and flags are kept in arrays.
+    """
+
+    def __init__(self, date: str | None = None) -> None:
+        """Init class."""
+        self.date = date
+        self._strings: dict[str, list[str]] = {field: [] for field in _STRING_FIELDS}
+        self._integers = {field: array("i") for field in _INTEGER_FIELDS}
+        self._partner_ids: list[int | str] = []
+        self.codes = self._strings["n"]
+        self.descriptions = self._strings["d"]
+        self.cities = self._strings["g"]
+        self.streets = self._strings["e"]
+        self.latitudes = array("d")
+        self.longitudes = array("d")
+        self._rows_by_code: dict[str, int] = {}
+
+    def __len__(self) -> int:
+        """Get number of parcel lockers."""
+        return len(self.codes)
+
+    def __iter__(self) -> Iterator[CatalogRow]:
+        """Iterate over catalog rows."""
+        return (CatalogRow(self, index) for index in range(len(self.codes)))
+
+    def __getitem__(self, index: int) -> CatalogRow:
+        """Get catalog row."""
+        if not 0 <= index < len(self.codes):
+            raise IndexError(index)
+        return CatalogRow(self, index)
+
+    def append(self, item: dict[str, Any]) -> CatalogRow:
+        """
+        Add points.json item to the catalog.
+
+        Values are checked like InPostAirPoint decoder does, so whole number
+        coordinates are accepted and converted to float.
+        """
+        try:
+            strings = [item[field] for field in _STRING_FIELDS]
+            integers = [item[field] for field in _INTEGER_FIELDS]
+            partner_id = item["q"]
+            latitude = item["l"]["a"]
+            longitude = item["l"]["o"]
+        except (KeyError, TypeError) as e:
+            raise ValueError(f"Malformed parcel locker entry: {item}") from e
+
+        if not (
+            all(isinstance(value, str) for value in strings)
+            and all(isinstance(value, int) for value in integers)
+            and isinstance(partner_id, int | str)
+            and _is_coordinate(latitude)
+            and _is_coordinate(longitude)
+        ):
+            raise ValueError(f"Malformed parcel locker entry: {item}")
+        strings = [intern(value) for value in strings]
+
+        for field, value in zip(_STRING_FIELDS, strings, strict=True):
+            self._strings[field].append(value)
+        for field, value in zip(_INTEGER_FIELDS, integers, strict=True):
+            self._integers[field].append(value)
+        self._partner_ids.append(
+            intern(partner_id) if isinstance(partner_id, str) else partner_id
+        )
+        self.latitudes.append(float(latitude))
+        self.longitudes.append(float(longitude))
+
+        index = len(self.codes) - 1
+        self._rows_by_code.setdefault(self.codes[index], index)
+        return CatalogRow(self, index)
+
+    def find(self, code: str) -> CatalogRow | None:
+        """Find row of parcel locker with given code."""
+        index = self._rows_by_code.get(code)
+        return None if index is None else CatalogRow(self, index)
+
+    @cached_property
+    def spatial_index(self) -> GridIndex:
+        """Spatial index over parcel lockers coordinates, built on first use."""
+        return GridIndex(self.latitudes, self.longitudes)
+
+    @cached_property
+    def text_index(self) -> SubstringIndex:
+        """Substring index over codes, cities and streets, built on first use."""
+        return SubstringIndex(
+            f"{code} {city} {street}"
+            for code, city, street in zip(
+                self.codes, self.cities, self.streets, strict=True
+            )
+        )
+
+    def to_point(self, index: int) -> InPostAirPoint:
+        """Materialize full parcel locker data of given row."""
+        strings = {field: column[index] for field, column in self._strings.items()}
+        integers = {field: column[index] for field, column in self._integers.items()}
+
+        return InPostAirPoint(
+            **strings,
+            **integers,
+            q=self._partner_ids[index],
+            l=InPostAirPointCoordinates(self.latitudes[index], self.longitudes[index]),
+        )
+
+    def as_dict(self) -> dict[str, Any]:
+        """Get catalog in a JSON serializable form."""
+        return {
+            "date": self.date,
+            "columns": {
+                **self._strings,
+                **{field: column.tolist() for field, column in self._integers.items()},
+                "q": self._partner_ids,
+                "latitude": self.latitudes.tolist(),
+                "longitude": self.longitudes.tolist(),
+            },
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict[str, Any]) -> CompactCatalog:
+        """Restore catalog stored with as_dict."""
+        catalog = cls(data.get("date"))
+        columns = data["columns"]
+
+        for field in _STRING_FIELDS:
+            catalog._strings[field][:] = [intern(value) for value in columns[field]]
+        for field in _INTEGER_FIELDS:
+            catalog._integers[field].extend(columns[field])
+        catalog._partner_ids[:] = [
+            intern(value) if isinstance(value, str) else value for value in columns["q"]
+        ]
+        catalog.latitudes.extend(columns["latitude"])
+        catalog.longitudes.extend(columns["longitude"])
+
+        lengths = {
+            len(column)
+            for column in (
+                *catalog._strings.values(),
+                *catalog._integers.values(),
+                catalog._partner_ids,
+                catalog.latitudes,
+                catalog.longitudes,
+            )
+        }
+        if len(lengths) > 1:
+            raise ValueError("Catalog columns have different lengths")
+
+        for index, code in enumerate(catalog.codes):
+            catalog._rows_by_code.setdefault(code, index)
+
+        return catalog
+
+    @classmethod
+    def from_items(cls, items: list[dict[str, Any]]) -> CompactCatalog:
+        """Build catalog from points.json items."""
+        catalog = cls()
+        for item in items:
+            catalog.append(item)
+        return catalog
+
+
+class ParcelLockerCatalogCache:
+    """
+    Keeps the points.json catalog in memory and on disk.
+
+    The catalog is served from memory while it is younger than CATALOG_TTL,
+    afterwards it is revalidated with ETag / If-Modified-Since validators.
+    """
+
+    def __init__(self, hass: HomeAssistant) -> None:
+        """Init class."""
+        self.hass = hass
+        self.lock = asyncio.Lock()
+        self._store: Store[dict[str, Any]] = Store(hass, STORAGE_VERSION, STORAGE_KEY)
+        self._loaded = False
+        self.catalog: CompactCatalog | None = None
+        self.etag: str | None = None
+        self.last_modified: str | None = None
+        self.fetched_at: float | None = None
+
+    @property
+    def is_fresh(self) -> bool:
+        """Return True if the cached catalog can be used without revalidation."""
+        return (
+            self.catalog is not None
+            and self.fetched_at is not None
+            and dt_util.utcnow().timestamp() - self.fetched_at
+            < CATALOG_TTL.total_seconds()
+        )
+
+    async def async_load(self) -> None:
+        """Load the catalog stored on disk, once."""
+        if self._loaded:
+            return
+        self._loaded = True
+
+        if (stored := await self._store.async_load()) is None:
+            return
+
+        try:
+            self.catalog = await self.hass.async_add_executor_job(
+                CompactCatalog.from_dict, stored["catalog"]
+            )
+        except (KeyError, TypeError, ValueError):
+            _LOGGER.debug("Ignoring invalid parcel lockers catalog stored on disk")
+            return
+
+        self.etag = stored.get("etag")
+        self.last_modified = stored.get("last_modified")
+        self.fetched_at = stored.get("fetched_at")
+
+    def conditional_headers(self) -> dict[str, str]:
+        """Get headers used to revalidate the cached catalog."""
+        if self.catalog is None:
+            return {}
+
+        headers = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+    @callback
+    def async_touch(self) -> None:
+        """Mark the cached catalog as revalidated."""
+        _LOGGER.debug("Parcel lockers catalog not modified")
+        self.fetched_at = dt_util.utcnow().timestamp()
+        self._store.async_delay_save(self._data_to_save, STORAGE_SAVE_DELAY)
+
+    @callback
+    def async_update(self, catalog: CompactCatalog, headers: Mapping[str, str]) -> None:
+        """Replace the cached catalog with a freshly downloaded one."""
+        self.catalog = catalog
+        self.etag = headers.get("ETag")
+        self.last_modified = headers.get("Last-Modified")
+        self.fetched_at = dt_util.utcnow().timestamp()
+        self._store.async_delay_save(self._data_to_save, STORAGE_SAVE_DELAY)
+
+    def _data_to_save(self) -> dict[str, Any]:
+        """Get data to store on disk."""
+        return {
+            "catalog": self.catalog.as_dict() if self.catalog is not None else None,
+            "etag": self.etag,
+            "last_modified": self.last_modified,
+            "fetched_at": self.fetched_at,
+        }
+
+
+@callback
+def async_get_catalog_cache(hass: HomeAssistant) -> ParcelLockerCatalogCache:
+    """Get the catalog cache shared by all InPost API clients."""
+    domain_data = hass.data.setdefault(DOMAIN, {})
+    if (catalog := domain_data.get(DATA_CATALOG)) is None:
+        catalog = domain_data[DATA_CATALOG] = ParcelLockerCatalogCache(hass)
+    return catalog
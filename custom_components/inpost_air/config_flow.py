@@ -9,36 +9,60 @@ from typing import Any
 import voluptuous as vol
 
 from homeassistant import config_entries
-from homeassistant.core import HomeAssistant
+from homeassistant.core import HomeAssistant, callback
 from homeassistant.data_entry_flow import FlowResult
 from homeassistant.exceptions import HomeAssistantError
 from homeassistant.helpers.selector import (
+    BooleanSelector,
     SelectSelector,
     SelectSelectorConfig,
     SelectOptionDict,
+    TextSelector,
 )
+from homeassistant.util import dt as dt_util
 
 
-from .api import InPostAirPoint, InPostApi
-from .const import CONF_PARCEL_LOCKER_ID, DOMAIN
-from .utils import haversine
+from .air_index import async_get_air_index
+from .api import (
+    InPostAirApiClientSensorsMissingError,
+    InPostAirPoint,
+    async_get_api_client,
+)
+from .catalog import CompactCatalog
+from .const import (
+    CONF_LOCKER_ID,
+    CONF_LOCKER_ID_VERIFIED_AT,
+    CONF_PARCEL_LOCKER_ID,
+    CONF_SEARCH,
+    CONF_SHARED_POLLING,
+    DOMAIN,
+)
 
 _LOGGER = logging.getLogger(__name__)
 
+PARCEL_LOCKERS_LIMIT = 50
+# Lockers known to have air data are listed first, known to have none last
+AIR_DATA_ORDER = {True: 0, None: 1, False: 2}
+AIR_DATA_MARKS = {True: "✓ ", None: "", False: "✗ "}
+
 
 @dataclass
 class SimpleParcelLocker:
     code: str
     description: str
     distance: float
+    has_air_data: bool | None = None
 
 
-async def validate_input(hass: HomeAssistant, data: dict[str, Any]) -> InPostAirPoint:
+async def validate_input(
+    hass: HomeAssistant, data: dict[str, Any]
+) -> tuple[InPostAirPoint, str]:
     """Validate the user input allows us to connect.
 
     Data has the keys from STEP_USER_DATA_SCHEMA with values provided by the user.
+    Returns the parcel locker with its resolved ID.
     """
-    api_client = InPostApi(hass)
+    api_client = async_get_api_client(hass)
     parcel_locker = await api_client.search_parcel_locker(
         data[CONF_PARCEL_LOCKER_ID].upper()
     )
@@ -46,13 +70,19 @@ async def validate_input(hass: HomeAssistant, data: dict[str, Any]) -> InPostAir
     if parcel_locker is None:
         raise UnknownParcelLocker
 
+    air_index = async_get_air_index(hass)
+    await air_index.async_load()
     try:
         parcel_locker_id = await api_client.find_parcel_locker_id(parcel_locker)
         await api_client.get_parcel_locker_air_data(parcel_locker.n, parcel_locker_id)
+    except InPostAirApiClientSensorsMissingError as exc:
+        air_index.async_set(parcel_locker.n, False)
+        raise ParcelLockerWithoutAirData from exc
     except Exception as exc:
         raise ParcelLockerWithoutAirData from exc
 
-    return parcel_locker
+    air_index.async_set(parcel_locker.n, True)
+    return parcel_locker, parcel_locker_id
 
 
 class InPostAirConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
@@ -61,53 +91,90 @@ class InPostAirConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
     VERSION = 2
     MINOR_VERSION = 1
 
+    def __init__(self) -> None:
+        """Init config flow."""
+        self._search = ""
+
+    @staticmethod
+    @callback
+    def async_get_options_flow(
+        config_entry: config_entries.ConfigEntry,
+    ) -> InPostAirOptionsFlow:
+        """Get the options flow for this handler."""
+        return InPostAirOptionsFlow(config_entry)
+
     async def async_step_user(
         self, user_input: dict[str, Any] | None = None
     ) -> FlowResult:
         """Handle the initial step."""
         errors: dict[str, str] = {}
         if user_input is not None:
-            try:
-                parcel_locker = await validate_input(self.hass, user_input)
-
-                await self.async_set_unique_id(parcel_locker.n)
-                self._abort_if_unique_id_configured()
-            except UnknownParcelLocker:
-                errors["base"] = "unknown_parcel_locker"
-            except ParcelLockerWithoutAirData:
-                errors["base"] = "parcel_locker_no_data"
+            search = user_input.get(CONF_SEARCH, "").strip()
+            if search != self._search:
+                self._search = search
+            elif not user_input.get(CONF_PARCEL_LOCKER_ID):
+                errors["base"] = "parcel_locker_not_selected"
             else:
-                return self.async_create_entry(
-                    title=f"Parcel locker {parcel_locker.n}",
-                    data={"parcel_locker": parcel_locker},
-                )
+                try:
+                    parcel_locker, parcel_locker_id = await validate_input(
+                        self.hass, user_input
+                    )
+
+                    await self.async_set_unique_id(parcel_locker.n)
+                    self._abort_if_unique_id_configured()
+                except UnknownParcelLocker:
+                    errors["base"] = "unknown_parcel_locker"
+                except ParcelLockerWithoutAirData:
+                    errors["base"] = "parcel_locker_no_data"
+                else:
+                    return self.async_create_entry(
+                        title=f"Parcel locker {parcel_locker.n}",
+                        data={
+                            "parcel_locker": parcel_locker,
+                            CONF_LOCKER_ID: parcel_locker_id,
+                            CONF_LOCKER_ID_VERIFIED_AT: dt_util.utcnow().timestamp(),
+                        },
+                    )
+
+        api_client = async_get_api_client(self.hass)
+        catalog = await api_client.get_parcel_lockers_catalog()
+        # Building indices and ranking thousands of lockers would block the loop
+        parcel_lockers = await self.hass.async_add_executor_job(
+            self._find_parcel_lockers, catalog
+        )
+
+        air_index = async_get_air_index(self.hass)
+        await air_index.async_load()
+        for locker in parcel_lockers:
+            locker.has_air_data = air_index.get(locker.code)
+        # Stable, so lockers stay ranked by distance within each group
+        parcel_lockers.sort(key=lambda locker: AIR_DATA_ORDER[locker.has_air_data])
+        # Marks of the listed lockers are filled in for the next search
+        air_index.async_probe(
+            api_client, catalog, (locker.code for locker in parcel_lockers)
+        )
 
-        parcel_lockers = [
-            SimpleParcelLocker(
-                code=locker.n,
-                description=locker.d,
-                distance=haversine(
-                    self.hass.config.longitude,
-                    self.hass.config.latitude,
-                    locker.l.o,
-                    locker.l.a,
-                ),
-            )
-            for locker in await InPostApi(self.hass).get_parcel_lockers_list()
-        ]
         options = [
             SelectOptionDict(
-                label=f"{locker.code} [{locker.distance:.2f}km] ({locker.description})",
+                label=(
+                    f"{AIR_DATA_MARKS[locker.has_air_data]}{locker.code} "
+                    f"[{locker.distance:.2f}km] ({locker.description})"
+                ),
                 value=locker.code,
             )
-            for locker in sorted(parcel_lockers, key=lambda locker: locker.distance)
+            for locker in parcel_lockers
         ]
+        if self._search and not options:
+            errors["base"] = "no_parcel_lockers_found"
 
         return self.async_show_form(
             step_id="user",
             data_schema=vol.Schema(
                 {
-                    vol.Required(CONF_PARCEL_LOCKER_ID): SelectSelector(
+                    vol.Optional(
+                        CONF_SEARCH, description={"suggested_value": self._search}
+                    ): TextSelector(),
+                    vol.Optional(CONF_PARCEL_LOCKER_ID): SelectSelector(
                         SelectSelectorConfig(
                             options=options,
                             custom_value=True,
@@ -118,6 +185,60 @@ class InPostAirConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
             errors=errors,
         )
 
+    def _find_parcel_lockers(self, catalog: CompactCatalog) -> list[SimpleParcelLocker]:
+        """Get parcel lockers nearest to home, matching the search query if given."""
+        latitude, longitude = self.hass.config.latitude, self.hass.config.longitude
+
+        if self._search:
+            ranked = sorted(
+                catalog.spatial_index.distances(
+                    latitude,
+                    longitude,
+                    list(catalog.text_index.search(self._search)),
+                )
+            )[:PARCEL_LOCKERS_LIMIT]
+        else:
+            ranked = catalog.spatial_index.nearest(
+                latitude, longitude, PARCEL_LOCKERS_LIMIT
+            )
+
+        return [
+            SimpleParcelLocker(
+                code=catalog.codes[row],
+                description=catalog.descriptions[row],
+                distance=distance,
+            )
+            for distance, row in ranked
+        ]
+
+
+class InPostAirOptionsFlow(config_entries.OptionsFlow):
+    """Handle options of InPost Air."""
+
+    def __init__(self, config_entry: config_entries.ConfigEntry) -> None:
+        """Init options flow."""
+        # OptionsFlow only has config_entry since Home Assistant 2024.11
+        self._entry = config_entry
+
+    async def async_step_init(
+        self, user_input: dict[str, Any] | None = None
+    ) -> FlowResult:
+        """Manage the options."""
+        if user_input is not None:
+            return self.async_create_entry(data=user_input)
+
+        return self.async_show_form(
+            step_id="init",
+            data_schema=vol.Schema(
+                {
+                    vol.Required(
+                        CONF_SHARED_POLLING,
+                        default=self._entry.options.get(CONF_SHARED_POLLING, False),
+                    ): BooleanSelector(),
+                }
+            ),
+        )
+
 
 class UnknownParcelLocker(HomeAssistantError):
     """Parcel locker with that ID doesn't exist."""
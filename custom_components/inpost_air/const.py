@@ -4,6 +4,10 @@ from enum import StrEnum
 
 DOMAIN = "inpost_air"
 CONF_PARCEL_LOCKER_ID = "parcelLockerId"
+CONF_SEARCH = "search"
+CONF_LOCKER_ID = "locker_id"
+CONF_LOCKER_ID_VERIFIED_AT = "locker_id_verified_at"
+CONF_SHARED_POLLING = "shared_polling"
 
 
 class Entities(StrEnum):
@@ -5,16 +5,40 @@ from dataclasses import dataclass
 from datetime import timedelta
 import logging
 import re
+from typing import Any
 
-from homeassistant.core import HomeAssistant
+from homeassistant.core import CALLBACK_TYPE, HomeAssistant, callback
+from homeassistant.helpers import device_registry, entity_registry
+from homeassistant.helpers.event import async_track_time_interval
+from homeassistant.helpers.storage import Store
 from homeassistant.helpers.update_coordinator import DataUpdateCoordinator, UpdateFailed
+from homeassistant.util import dt as dt_util
 
 from .models import ParcelLocker
-from .api import InPostAirApiClientError, InPostApi
-from .const import Entities
+from .api import InPostAirApiClientError, InPostApi, request_deadline
+from .const import DOMAIN, Entities
+from .history import STATISTIC_PERIODS, HistoryFetchError, async_get_history_fetcher
+from .rolling import POLLUTANTS, AirQualityAggregator, replay_states
+from .utils import get_device_info, stable_fraction
 
 _LOGGER = logging.getLogger(__name__)
 
+UPDATE_INTERVAL = timedelta(minutes=5)
+# Time budget of a refresh, including retries of the request
+REFRESH_TIMEOUT = timedelta(seconds=30)
+# Spread of first refreshes of parcel lockers without data to show meanwhile
+FIRST_REFRESH_SPREAD = timedelta(seconds=30)
+
+DATA_HUB_COORDINATOR = "hub_coordinator"
+HUB_MAX_CONCURRENT_REFRESHES = 4
+
+# Recorder statistics period used to seed rolling window of given hours
+SEED_STATISTIC_PERIODS = {1: "5minute", 8: "hour", 24: "hour"}
+
+SNAPSHOT_STORAGE_VERSION = 1
+SNAPSHOT_SAVE_DELAY = 60
+SNAPSHOT_MAX_AGE = timedelta(hours=1)
+
 
 @dataclass
 class ValueWithNorm:
@@ -33,47 +57,106 @@ class ValueWithoutNorm:
     value: float
 
 
+@dataclass(frozen=True)
+class SensorLineSpec:
+    """Describes values reported in an air_sensors line."""
+
+    has_norm: bool = False
+    allows_negative: bool = False
+
+
+SENSOR_LINE_SPECS: dict[str, SensorLineSpec] = {
+    Entities.PM2_5: SensorLineSpec(has_norm=True),
+    Entities.PM10: SensorLineSpec(has_norm=True),
+    Entities.PM1: SensorLineSpec(),
+    Entities.PM4: SensorLineSpec(),
+    Entities.Temperature: SensorLineSpec(allows_negative=True),
+    Entities.Pressure: SensorLineSpec(),
+    Entities.Humidity: SensorLineSpec(),
+    Entities.NO2: SensorLineSpec(),
+    Entities.O3: SensorLineSpec(),
+}
+UNKNOWN_SENSOR_LINE_SPEC = SensorLineSpec(has_norm=True, allows_negative=True)
+
+_NUMBER = re.compile(r"-?\d+(?:\.\d+)?")
+_reported_unknown_sensors: set[str] = set()
+
+
+def _parse_number(text: str, allows_negative: bool) -> float | None:
+    """Parse number from sensor line, None if it's missing or not allowed."""
+    if _NUMBER.fullmatch(text) is None or (not allows_negative and text[0] == "-"):
+        return None
+    return float(text)
+
+
 def create_value(sensor_line: str) -> ValueWithNorm | ValueWithoutNorm | None:
-    """Create value class from sensor data string."""
-    if match := re.match(r"PM25:(\d+(?:\.\d+)?):(\d+(?:\.\d+)?)", sensor_line):
-        return ValueWithNorm(
-            Entities.PM2_5, float(match.group(1)), float(match.group(2))
-        )
-    if match := re.match(r"PM10:(\d+(?:\.\d+)?):(\d+(?:\.\d+)?)", sensor_line):
-        return ValueWithNorm(
-            Entities.PM10, float(match.group(1)), float(match.group(2))
-        )
-    if match := re.match(r"PM1:(\d+(?:\.\d+)?):", sensor_line):
-        return ValueWithoutNorm(Entities.PM1, float(match.group(1)))
-    if match := re.match(r"PM4:(\d+(?:\.\d+)?):", sensor_line):
-        return ValueWithoutNorm(Entities.PM4, float(match.group(1)))
-    if match := re.match(r"TEMPERATURE:(-?\d+(?:\.\d+)?):", sensor_line):
-        return ValueWithoutNorm(Entities.Temperature, float(match.group(1)))
-    if match := re.match(r"PRESSURE:(\d+(?:\.\d+)?):", sensor_line):
-        return ValueWithoutNorm(Entities.Pressure, float(match.group(1)))
-    if match := re.match(r"HUMIDITY:(\d+(?:\.\d+)?):", sensor_line):
-        return ValueWithoutNorm(Entities.Humidity, float(match.group(1)))
-    if match := re.match(r"NO2:(\d+(?:\.\d+)?):", sensor_line):
-        return ValueWithoutNorm(Entities.NO2, float(match.group(1)))
-    if match := re.match(r"O3:(\d+(?:\.\d+)?):", sensor_line):
-        return ValueWithoutNorm(Entities.O3, float(match.group(1)))
+    """Create value class from sensor data string, e.g. `PM25:10.5:42`."""
+    name, _, rest = sensor_line.partition(":")
+    value, _, norm = rest.partition(":")
+    if not name:
+        return None
+
+    if (spec := SENSOR_LINE_SPECS.get(name)) is None:
+        if name not in _reported_unknown_sensors:
+            _reported_unknown_sensors.add(name)
+            _LOGGER.warning("Unknown air sensor reported by InPost: %s", sensor_line)
+        spec = UNKNOWN_SENSOR_LINE_SPEC
+    else:
+        name = Entities(name)
+
+    if (parsed_value := _parse_number(value, spec.allows_negative)) is None:
+        _LOGGER.debug("Invalid air sensor value: %s", sensor_line)
+        return None
+
+    if spec.has_norm and (parsed_norm := _parse_number(norm, False)) is not None:
+        return ValueWithNorm(name, parsed_value, parsed_norm)
+
+    return ValueWithoutNorm(name, parsed_value)
 
 
 class InPostAirDataCoordinator(DataUpdateCoordinator):
     """My custom coordinator."""
 
     def __init__(
-        self, hass: HomeAssistant, api_client: InPostApi, parcel_locker: ParcelLocker
+        self,
+        hass: HomeAssistant,
+        api_client: InPostApi,
+        parcel_locker: ParcelLocker,
+        snapshot_store: Store[dict[str, Any]] | None = None,
+        update_interval: timedelta | None = UPDATE_INTERVAL,
     ) -> None:
-        """Initialize my coordinator."""
+        """
+        Initialize my coordinator.
+
+        Without update_interval it's refreshed by InPostAirHubCoordinator.
+        """
         super().__init__(
             hass,
             _LOGGER,
             name=f"Parcel Locker {parcel_locker.locker_code} data coordinator",
-            update_interval=timedelta(minutes=5),
+            update_interval=update_interval,
         )
         self.api_client = api_client
         self.parcel_locker = parcel_locker
+        self.aggregator = AirQualityAggregator()
+        self._created_at = dt_util.utcnow()
+        self._seed_task: asyncio.Task | None = None
+        self._snapshot_store = snapshot_store
+        self._aggregator_restored = False
+        self._fetched_at: float | None = None
+
+    @property
+    def first_refresh_delay(self) -> float:
+        """
+        Get seconds to wait before the first refresh which doesn't block setup.
+
+        The delay is derived from the parcel locker code, so lockers don't
+        refresh at once at startup and keep their order across restarts.
+        Periodic polls follow the first refresh, so they're spread too. When
+        there's no data to show meanwhile, spread is shorter.
+        """
+        spread = UPDATE_INTERVAL if self.data is not None else FIRST_REFRESH_SPREAD
+        return stable_fraction(self.parcel_locker.locker_code) * spread.total_seconds()
 
     async def _async_update_data(self):
         """Fetch data from API endpoint.
@@ -82,15 +165,268 @@ class InPostAirDataCoordinator(DataUpdateCoordinator):
         so entities can quickly look up their data.
         """
         try:
-            async with asyncio.timeout(10):
+            with request_deadline(REFRESH_TIMEOUT.total_seconds()):
                 data = await self.api_client.get_parcel_locker_air_data(
                     self.parcel_locker.locker_code, self.parcel_locker.locker_id
                 )
 
-                return {
+                values = {
                     x.name: x for line in data.air_sensors if (x := create_value(line))
                 }
         except InPostAirApiClientError as err:
             raise UpdateFailed(err) from err
         except Exception as err:
             raise UpdateFailed("Error communicating with API") from err
+
+        self._fetched_at = dt_util.utcnow().timestamp()
+        self.aggregator.add_values(
+            {pollutant: item.value for pollutant, item in values.items()},
+            self._fetched_at,
+        )
+        if self._snapshot_store is not None:
+            self._snapshot_store.async_delay_save(
+                self._snapshot_data, SNAPSHOT_SAVE_DELAY
+            )
+        return values
+
+    async def async_restore_snapshot(self) -> bool:
+        """
+        Restore rolling means and last fetched data saved before restart.
+
+        Returns True if the data is recent enough to be used until the next
+        refresh. Restored rolling means replace seeding from the recorder.
+        """
+        if self._snapshot_store is None or (
+            (snapshot := await self._snapshot_store.async_load()) is None
+        ):
+            return False
+
+        try:
+            fetched_at = float(snapshot["fetched_at"])
+            values: dict[str, ValueWithNorm | ValueWithoutNorm] = {}
+            for name, value in snapshot["values"].items():
+                name = Entities(name) if name in SENSOR_LINE_SPECS else name
+                values[name] = (
+                    ValueWithNorm(name, *value)
+                    if len(value) == 2
+                    else ValueWithoutNorm(name, *value)
+                )
+            self.aggregator.restore(snapshot["rolling"])
+        except (KeyError, TypeError, ValueError):
+            _LOGGER.debug("Ignoring invalid snapshot of %s", self.name)
+            return False
+
+        self._aggregator_restored = True
+        if dt_util.utcnow().timestamp() - fetched_at > SNAPSHOT_MAX_AGE.total_seconds():
+            return False
+
+        self._fetched_at = fetched_at
+        self.data = values
+        return True
+
+    def _snapshot_data(self) -> dict[str, Any]:
+        """Get data saved in the snapshot."""
+        return {
+            "fetched_at": self._fetched_at,
+            "values": {
+                name: [item.value, item.norm]
+                if isinstance(item, ValueWithNorm)
+                else [item.value]
+                for name, item in (self.data or {}).items()
+            },
+            "rolling": self.aggregator.as_dict(),
+        }
+
+    async def async_seed_aggregator(self) -> None:
+        """Fill rolling means with measurements recorded before setup, only once."""
+        if self._aggregator_restored:
+            return
+        if self._seed_task is None:
+            self._seed_task = self.hass.async_create_task(
+                self._async_seed_aggregator(),
+                f"{self.name} rolling means seed",
+            )
+        await asyncio.shield(self._seed_task)
+
+    async def _async_seed_aggregator(self) -> None:
+        """Seed rolling means with recorded measurements of pollutant sensors."""
+        if not (entity_ids := self._async_get_pollutant_entity_ids()):
+            return
+
+        windows_by_period: dict[str, list[int]] = {}
+        for hours, period in SEED_STATISTIC_PERIODS.items():
+            windows_by_period.setdefault(period, []).append(hours)
+
+        try:
+            await asyncio.gather(
+                *(
+                    self._async_seed_windows(entity_ids, period, window_hours)
+                    for period, window_hours in windows_by_period.items()
+                )
+            )
+        except HistoryFetchError as err:
+            _LOGGER.warning("Couldn't load recorded air quality history: %s", err)
+
+    async def _async_seed_windows(
+        self, entity_ids: dict[str, str], period: str, window_hours: list[int]
+    ) -> None:
+        """
+        Seed windows with compiled statistics means.
+
+        Raw states are read only for the most recent part of the windows,
+        which statistics weren't compiled for yet.
+        """
+        fetcher = async_get_history_fetcher(self.hass)
+        end_time = self._created_at
+        start_time = end_time - timedelta(hours=max(window_hours))
+        interval = UPDATE_INTERVAL.total_seconds()
+        period_length = STATISTIC_PERIODS[period].total_seconds()
+
+        compiled = await fetcher.async_get_statistics(
+            entity_ids, start_time, end_time, period
+        )
+        covered_until = {}
+        for entity_id, pollutant in entity_ids.items():
+            rows = compiled.get(entity_id, [])
+            for start, mean in rows:
+                if mean is not None:
+                    self.aggregator.add(
+                        pollutant, start, mean, period_length / interval, window_hours
+                    )
+            covered_until[entity_id] = (
+                dt_util.utc_from_timestamp(rows[-1][0] + period_length)
+                if rows
+                else start_time
+            )
+
+        recorded = await asyncio.gather(
+            *(
+                fetcher.async_get_states([entity_id], start, end_time)
+                for entity_id, start in covered_until.items()
+            )
+        )
+        # Without the state active at the start, e.g. if no recorder run covers
+        # it, the time until the first recorded change is left unseeded
+        for entity_id, states in zip(covered_until, recorded, strict=True):
+            for timestamp, value, weight in replay_states(
+                states[entity_id], end_time.timestamp(), interval
+            ):
+                self.aggregator.add(
+                    entity_ids[entity_id], timestamp, value, weight, window_hours
+                )
+
+    def _async_get_pollutant_entity_ids(self) -> dict[str, str]:
+        """Get IDs of this parcel locker's pollutant sensors."""
+        device = device_registry.async_get(self.hass).async_get_device(
+            identifiers=get_device_info(self.parcel_locker).get("identifiers")
+        )
+        if device is None:
+            return {}
+
+        return {
+            entity.entity_id: pollutant
+            for entity in entity_registry.async_entries_for_device(
+                entity_registry.async_get(self.hass), device.id
+            )
+            if entity.translation_key is not None
+            and (pollutant := entity.translation_key.upper()) in POLLUTANTS
+        }
+
+
+class InPostAirHubCoordinator:
+    """
+    Refreshes coordinators of many parcel lockers on a single schedule.
+
+    Coordinators added to the hub have no timers of their own. Every
+    UPDATE_INTERVAL the hub refreshes all of them, at most
+    HUB_MAX_CONCURRENT_REFRESHES at a time, and each one notifies only
+    entities of its own parcel locker. Parcel lockers which ID isn't resolved
+    yet are skipped.
+    """
+
+    def __init__(
+        self,
+        hass: HomeAssistant,
+        update_interval: timedelta = UPDATE_INTERVAL,
+        max_concurrent_refreshes: int = HUB_MAX_CONCURRENT_REFRESHES,
+    ) -> None:
+        """Init class."""
+        self.hass = hass
+        self.update_interval = update_interval
+        self._coordinators: list[InPostAirDataCoordinator] = []
+        self._semaphore = asyncio.Semaphore(max_concurrent_refreshes)
+        self._unsub_refresh: CALLBACK_TYPE | None = None
+        self._refresh_task: asyncio.Task | None = None
+
+    @callback
+    def async_add_coordinator(
+        self, coordinator: InPostAirDataCoordinator
+    ) -> CALLBACK_TYPE:
+        """Refresh coordinator with the others, returns callback removing it."""
+        self._coordinators.append(coordinator)
+        if self._unsub_refresh is None:
+            self._unsub_refresh = async_track_time_interval(
+                self.hass,
+                self._async_handle_refresh_interval,
+                self.update_interval,
+                name=f"{DOMAIN} hub refresh",
+                cancel_on_shutdown=True,
+            )
+
+        @callback
+        def remove_coordinator() -> None:
+            self._coordinators.remove(coordinator)
+            if not self._coordinators and self._unsub_refresh is not None:
+                self._unsub_refresh()
+                self._unsub_refresh = None
+
+        return remove_coordinator
+
+    @callback
+    def _async_handle_refresh_interval(self, _now: Any) -> None:
+        """Start refreshing all coordinators, unless the last round still runs."""
+        if self._refresh_task is not None and not self._refresh_task.done():
+            _LOGGER.debug("Skipping hub refresh, previous one is still running")
+            return
+        self._refresh_task = self.hass.async_create_background_task(
+            self.async_refresh(), f"{DOMAIN} hub refresh"
+        )
+
+    async def async_refresh(self) -> None:
+        """Refresh all coordinators with bounded concurrency."""
+        await asyncio.gather(
+            *(
+                self._async_refresh_coordinator(coordinator)
+                for coordinator in list(self._coordinators)
+            )
+        )
+
+    async def _async_refresh_coordinator(
+        self, coordinator: InPostAirDataCoordinator
+    ) -> None:
+        """Refresh single coordinator once there's a free slot."""
+        if coordinator.parcel_locker.locker_id is None:
+            # Entry set up in background still resolves it, refreshes on its own
+            _LOGGER.debug(
+                "Skipping hub refresh of %s, its ID isn't known yet",
+                coordinator.parcel_locker.locker_code,
+            )
+            return
+
+        async with self._semaphore:
+            if coordinator in self._coordinators:
+                await coordinator.async_refresh()
+
+
+@callback
+def async_get_hub_coordinator(hass: HomeAssistant) -> InPostAirHubCoordinator:
+    """Get the hub coordinator shared by config entries with shared polling."""
+    domain_data = hass.data.setdefault(DOMAIN, {})
+    if (hub := domain_data.get(DATA_HUB_COORDINATOR)) is None:
+        hub = domain_data[DATA_HUB_COORDINATOR] = InPostAirHubCoordinator(hass)
+    return hub
+
+
+def create_snapshot_store(hass: HomeAssistant, entry_id: str) -> Store[dict[str, Any]]:
+    """Create store keeping coordinator snapshot of the config entry."""
+    return Store(hass, SNAPSHOT_STORAGE_VERSION, f"{DOMAIN}.{entry_id}.snapshot")
@@ -0,0 +1,140 @@
+"""Decoders creating dataclasses from JSON data."""
+
+from __future__ import annotations
+
+from collections.abc import Callable, Mapping
+from dataclasses import MISSING, fields, is_dataclass
+from types import NoneType, UnionType
+from typing import Any, Union, get_args, get_origin, get_type_hints
+
+_PLAIN_TYPES = (str, int, float, bool, NoneType)
+
+_decoders: dict[type, Callable[[Mapping[str, Any]], Any]] = {}
+
+
+class DecodeError(ValueError):
+    """Data doesn't match the dataclass."""
+
+
+def dataclass_decoder[T](cls: type[T]) -> Callable[[Mapping[str, Any]], T]:
+    """
+    Get function creating given dataclass from JSON data.
+
+    Code of the function is generated once per dataclass from its type
+    hints, so unlike dacite they aren't inspected again for every object.
+    Like dacite, extra keys are ignored, missing values are only allowed for
+    fields with defaults and values have to be instances of field types,
+    except int values of float fields, which are converted to float.
+    """
+    if (decoder := _decoders.get(cls)) is None:
+        decoder = _decoders[cls] = _compile(cls)
+    return decoder
+
+
+def _compile(cls: type) -> Callable[[Mapping[str, Any]], Any]:
+    """Generate decoder of the dataclass."""
+    if not is_dataclass(cls):
+        raise TypeError(f"{cls!r} isn't a dataclass")
+
+    hints = get_type_hints(cls)
+    namespace: dict[str, Any] = {
+        "cls": cls,
+        "Mapping": Mapping,
+        "DecodeError": DecodeError,
+        "MISSING": MISSING,
+    }
+    lines = [
+        "def decode(data):",
+        "    if not isinstance(data, Mapping):",
+        f"        raise DecodeError('{cls.__name__} data is ' + type(data).__name__)",
+        "    kwargs = {}",
+    ]
+    for field in fields(cls):
+        if not field.init:
+            continue
+
+        path = f"{cls.__name__}.{field.name}"
+        if field.default is MISSING and field.default_factory is MISSING:
+            lines += [
+                "    try:",
+                f"        value = data[{field.name!r}]",
+                "    except KeyError:",
+                f"        raise DecodeError('missing value of {path}') from None",
+            ]
+            indent = "    "
+        else:
+            lines += [
+                f"    value = data.get({field.name!r}, MISSING)",
+                "    if value is not MISSING:",
+            ]
+            indent = "        "
+
+        lines += [
+            indent + line
+            for line in (
+                *_check("value", hints[field.name], path, namespace),
+                f"kwargs[{field.name!r}] = value",
+            )
+        ]
+    lines.append("    return cls(**kwargs)")
+
+    # Only code generated above from type hints is executed, never the data
+    exec("\n".join(lines), namespace)  # noqa: S102 # pylint: disable=exec-used
+    return namespace["decode"]
+
+
+def _check(var: str, hint: Any, path: str, namespace: dict[str, Any]) -> list[str]:
+    """Generate lines checking type of the variable, decoding nested dataclasses."""
+    if hint is Any:
+        return []
+
+    if is_dataclass(hint):
+        namespace[f"decode_{hint.__name__}"] = dataclass_decoder(hint)
+        return [f"{var} = decode_{hint.__name__}({var})"]
+
+    origin = get_origin(hint)
+    if hint in _PLAIN_TYPES or (
+        origin in (Union, UnionType)
+        and all(arg in _PLAIN_TYPES for arg in get_args(hint))
+    ):
+        types = get_args(hint) if origin is not None else (hint,)
+        name = f"types_{len(namespace)}"
+        namespace[name] = types
+        return [
+            # JSON numbers without fraction are decoded as int, bool isn't one
+            *(
+                [f"if type({var}) is int:", f"    {var} = float({var})"]
+                if float in types and int not in types
+                else []
+            ),
+            f"if not isinstance({var}, {name}):",
+            f"    raise DecodeError('wrong type of {path}: ' + type({var}).__name__)",
+        ]
+
+    if origin in (Union, UnionType) and NoneType in (args := get_args(hint)):
+        # Optional value which has to be decoded
+        (other,) = (arg for arg in args if arg is not NoneType)
+        return [
+            f"if {var} is not None:",
+            *("    " + line for line in _check(var, other, path, namespace)),
+        ]
+
+    if origin is list:
+        (item_hint,) = get_args(hint) or (Any,)
+        item_var = f"item_{len(namespace)}"
+        return [
+            f"if not isinstance({var}, list):",
+            f"    raise DecodeError('wrong type of {path}: ' + type({var}).__name__)",
+            *(
+                [
+                    f"{var} = list({var})",
+                    f"for index, {item_var} in enumerate({var}):",
+                    *("    " + line for line in item_lines),
+                    f"    {var}[index] = {item_var}",
+                ]
+                if (item_lines := _check(item_var, item_hint, f"{path}[]", namespace))
+                else []
+            ),
+        ]
+
+    raise TypeError(f"Type of {path} isn't supported: {hint!r}")
@@ -0,0 +1,241 @@
+"""Batched access to the recorder history."""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+from bisect import bisect_left, bisect_right
+from collections.abc import Iterable
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from functools import partial
+
+from homeassistant.components import recorder
+from homeassistant.components.recorder import history, statistics
+from homeassistant.const import COMPRESSED_STATE_LAST_UPDATED, COMPRESSED_STATE_STATE
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.exceptions import HomeAssistantError
+from homeassistant.util import dt as dt_util
+from sqlalchemy.exc import SQLAlchemyError
+
+from custom_components.inpost_air.const import DOMAIN
+from custom_components.inpost_air.utils import can_be_float
+
+_LOGGER = logging.getLogger(__name__)
+
+DATA_HISTORY_FETCHER = "history_fetcher"
+BATCH_DELAY = 0.5
+STATISTIC_PERIODS = {
+    "5minute": timedelta(minutes=5),
+    "hour": timedelta(hours=1),
+}
+
+type NumericStates = list[tuple[float, float | None]]
+
+
+@dataclass
+class _HistoryRequest:
+    entity_ids: set[str]
+    start: float
+    end: float
+    period: str | None
+    future: asyncio.Future[dict[str, NumericStates]] = field(repr=False)
+
+
+class HistoryFetchError(HomeAssistantError):
+    """Recorder history couldn't be read."""
+
+
+class HistoryFetcher:
+    """
+    Reads numeric history of many entities with a single recorder query.
+
+    Requests made within BATCH_DELAY of each other, e.g. by all parcel lockers
+    set up at startup, are merged into one query over all their entities and
+    the union of their periods, one for raw states and one per statistics
+    period. Results aren't cached, as every parcel locker asks for history
+    until its own setup time, which no earlier query covers.
+    """
+
+    def __init__(self, hass: HomeAssistant) -> None:
+        """Init class."""
+        self.hass = hass
+        self._pending: list[_HistoryRequest] = []
+        self._flush_handle: asyncio.TimerHandle | None = None
+
+    async def async_get_states(
+        self, entity_ids: Iterable[str], start_time: datetime, end_time: datetime
+    ) -> dict[str, NumericStates]:
+        """
+        Get (timestamp, value) changes of entities during the period.
+
+        State active at the start of the period comes first with the start
+        timestamp. Values that aren't numbers are None.
+        """
+        return await self._async_get(entity_ids, start_time, end_time, None)
+
+    async def async_get_statistics(
+        self,
+        entity_ids: Iterable[str],
+        start_time: datetime,
+        end_time: datetime,
+        period: str,
+    ) -> dict[str, NumericStates]:
+        """
+        Get (start timestamp, mean) of compiled statistics within the period.
+
+        Only statistics of `period` length which fit in the period completely
+        are returned, entities without statistics are left out.
+        """
+        return await self._async_get(entity_ids, start_time, end_time, period)
+
+    async def _async_get(
+        self,
+        entity_ids: Iterable[str],
+        start_time: datetime,
+        end_time: datetime,
+        period: str | None,
+    ) -> dict[str, NumericStates]:
+        """Add request to the next batch."""
+        request = _HistoryRequest(
+            set(entity_ids),
+            start_time.timestamp(),
+            end_time.timestamp(),
+            period,
+            self.hass.loop.create_future(),
+        )
+
+        self._pending.append(request)
+        if self._flush_handle is None:
+            self._flush_handle = self.hass.loop.call_later(BATCH_DELAY, self._flush)
+
+        return await request.future
+
+    @callback
+    def _flush(self) -> None:
+        """Start queries for all requests collected so far."""
+        batches: dict[str | None, list[_HistoryRequest]] = {}
+        for request in self._pending:
+            batches.setdefault(request.period, []).append(request)
+        self._pending = []
+        self._flush_handle = None
+
+        for period, batch in batches.items():
+            self.hass.async_create_background_task(
+                self._async_fetch(period, batch), f"{DOMAIN} history fetch"
+            )
+
+    async def _async_fetch(
+        self, period: str | None, batch: list[_HistoryRequest]
+    ) -> None:
+        """Query the recorder once for the whole batch."""
+        entity_ids = set().union(*(request.entity_ids for request in batch))
+        start = min(request.start for request in batch)
+        end = max(request.end for request in batch)
+        _LOGGER.debug(
+            "Fetching %s history of %s entities for %s requests",
+            period or "state",
+            len(entity_ids),
+            len(batch),
+        )
+
+        try:
+            results = await recorder.get_instance(self.hass).async_add_executor_job(
+                partial(self._fetch_states, entity_ids)
+                if period is None
+                else partial(self._fetch_statistics, entity_ids, period=period),
+                dt_util.utc_from_timestamp(start),
+                dt_util.utc_from_timestamp(end),
+            )
+        except SQLAlchemyError as err:
+            for request in batch:
+                if not request.future.done():
+                    request.future.set_exception(HistoryFetchError(err))
+            return
+
+        for request in batch:
+            if not request.future.done():
+                request.future.set_result(_slice(results, request))
+
+    def _fetch_states(
+        self, entity_ids: set[str], start_time: datetime, end_time: datetime
+    ) -> dict[str, NumericStates]:
+        """Query raw states, runs in the recorder executor."""
+        recorded = history.get_significant_states(
+            self.hass,
+            start_time,
+            end_time,
+            list(entity_ids),
+            significant_changes_only=False,
+            minimal_response=True,
+            no_attributes=True,
+            compressed_state_format=True,
+        )
+        return {
+            entity_id: [
+                (
+                    state[COMPRESSED_STATE_LAST_UPDATED],
+                    float(value) if can_be_float(value) else None,
+                )
+                for state in entity_states
+                if (value := state[COMPRESSED_STATE_STATE]) is not None
+            ]
+            for entity_id, entity_states in recorded.items()
+        }
+
+    def _fetch_statistics(
+        self,
+        entity_ids: set[str],
+        start_time: datetime,
+        end_time: datetime,
+        period: str,
+    ) -> dict[str, NumericStates]:
+        """Query statistics means, runs in the recorder executor."""
+        compiled = statistics.statistics_during_period(
+            self.hass, start_time, end_time, entity_ids, period, None, {"mean"}
+        )
+        return {
+            entity_id: [(row["start"], row.get("mean")) for row in rows]
+            for entity_id, rows in compiled.items()
+        }
+
+
+def _slice(
+    results: dict[str, NumericStates], request: _HistoryRequest
+) -> dict[str, NumericStates]:
+    """Cut results of requested entities to the requested period."""
+    if request.period is None:
+        return {
+            entity_id: _slice_states(results.get(entity_id, []), request)
+            for entity_id in request.entity_ids
+        }
+
+    # Statistics are only returned if they lie within the period completely
+    last_start = request.end - STATISTIC_PERIODS[request.period].total_seconds()
+    sliced = {}
+    for entity_id in request.entity_ids & results.keys():
+        rows = results[entity_id]
+        first = bisect_left(rows, request.start, key=lambda row: row[0])
+        last = bisect_right(rows, last_start, key=lambda row: row[0])
+        if rows := rows[first:last]:
+            sliced[entity_id] = rows
+    return sliced
+
+
+def _slice_states(states: NumericStates, request: _HistoryRequest) -> NumericStates:
+    """Cut states to the requested period, starting with the state active at start."""
+    first = bisect_right(states, request.start, key=lambda state: state[0])
+    last = bisect_right(states, request.end, key=lambda state: state[0])
+    return [
+        *([(request.start, states[first - 1][1])] if first else []),
+        *states[first:last],
+    ]
+
+
+@callback
+def async_get_history_fetcher(hass: HomeAssistant) -> HistoryFetcher:
+    """Get the history fetcher shared by all parcel lockers."""
+    domain_data = hass.data.setdefault(DOMAIN, {})
+    if (fetcher := domain_data.get(DATA_HISTORY_FETCHER)) is None:
+        fetcher = domain_data[DATA_HISTORY_FETCHER] = HistoryFetcher(hass)
+    return fetcher
@@ -4,7 +4,7 @@ from dataclasses import dataclass
 class ParcelLocker:
     """ParcelLocker class."""
 
-    def __init__(self, locker_code: str, locker_id: str) -> None:
+    def __init__(self, locker_code: str, locker_id: str | None) -> None:
         """Init class."""
         self.locker_code = locker_code
         self.locker_id = locker_id
@@ -0,0 +1,194 @@
+"""Rolling averages of air quality measurements."""
+
+from __future__ import annotations
+
+from array import array
+from collections.abc import Iterable, Iterator, Mapping
+
+from custom_components.inpost_air.const import Entities
+
+POLLUTANTS = (Entities.PM2_5, Entities.PM10, Entities.NO2, Entities.O3)
+WINDOW_HOURS = (1, 8, 24)
+BUCKETS_PER_WINDOW = 48
+
+_EMPTY = -1
+
+
+class RollingMean:
+    """
+    Weighted mean of samples from the last `window` seconds.
+
+    Samples are summed into time buckets kept in a ring, together with running
+    totals of the whole window, so adding a sample and reading the mean are
+    O(1). Buckets are evicted as soon as they fall out of the window.
+    """
+
+    def __init__(self, window: float, buckets: int = BUCKETS_PER_WINDOW) -> None:
+        """Init class."""
+        self._bucket_length = window / buckets
+        self._ids = array("q", [_EMPTY] * buckets)
+        self._sums = array("d", [0.0] * buckets)
+        self._weights = array("d", [0.0] * buckets)
+        self._sum = 0.0
+        self._weight = 0.0
+        self._oldest: int | None = None
+        self._newest: int | None = None
+
+    def add(self, timestamp: float, value: float, weight: float = 1.0) -> None:
+        """Add a sample, samples older than the window are ignored."""
+        bucket = int(timestamp // self._bucket_length)
+        self._advance(bucket)
+        if bucket <= self._newest - len(self._ids):
+            return
+
+        slot = bucket % len(self._ids)
+        if self._ids[slot] != bucket:
+            # Slot can only hold an older, already expired bucket
+            self._evict(slot)
+            self._ids[slot] = bucket
+        self._sums[slot] += value * weight
+        self._weights[slot] += weight
+        self._sum += value * weight
+        self._weight += weight
+        self._oldest = bucket if self._oldest is None else min(self._oldest, bucket)
+
+    def mean(self, timestamp: float) -> float | None:
+        """Get mean of the window ending at timestamp, None if it has no samples."""
+        self._advance(int(timestamp // self._bucket_length))
+        if self._weight <= 1e-9:
+            return None
+        return self._sum / self._weight
+
+    def as_list(self) -> list[list[float]]:
+        """Get non-empty buckets as [bucket, sum, weight] lists."""
+        return [
+            [bucket, self._sums[slot], self._weights[slot]]
+            for slot, bucket in enumerate(self._ids)
+            if bucket != _EMPTY
+        ]
+
+    def restore(self, buckets: Iterable[list[float]]) -> None:
+        """Add buckets saved with as_list."""
+        for bucket, total, weight in buckets:
+            if weight > 0:
+                # Middle of the bucket, so rounding can't move it to a neighbour
+                self.add((bucket + 0.5) * self._bucket_length, total / weight, weight)
+
+    def _advance(self, bucket: int) -> None:
+        """Move the window end to given bucket if it's newer, evicting expired ones."""
+        if self._newest is not None and bucket <= self._newest:
+            return
+        self._newest = bucket
+        if self._oldest is None:
+            return
+
+        expired = bucket - len(self._ids)
+        if expired - self._oldest >= len(self._ids):
+            # Whole window expired, no need to walk over every bucket
+            for slot in range(len(self._ids)):
+                self._evict(slot)
+            self._oldest = None
+            return
+
+        while self._oldest <= expired:
+            slot = self._oldest % len(self._ids)
+            if self._ids[slot] == self._oldest:
+                self._evict(slot)
+            self._oldest += 1
+
+    def _evict(self, slot: int) -> None:
+        """Remove samples of the bucket in given slot from the totals."""
+        if self._ids[slot] == _EMPTY:
+            return
+        self._sum -= self._sums[slot]
+        self._weight -= self._weights[slot]
+        self._ids[slot] = _EMPTY
+        self._sums[slot] = 0.0
+        self._weights[slot] = 0.0
+        if self._weight <= 1e-9:
+            # Prevent floating point error from accumulating in empty window
+            self._sum = self._weight = 0.0
+
+
+class AirQualityAggregator:
+    """
+    Rolling means of pollutants used by air quality indices.
+
+    Fed with every set of measurements fetched by the coordinator, so the
+    indices don't have to read measurements back from the recorder.
+    """
+
+    def __init__(
+        self,
+        pollutants: Iterable[str] = POLLUTANTS,
+        window_hours: Iterable[int] = WINDOW_HOURS,
+    ) -> None:
+        """Init class."""
+        self._means = {
+            (pollutant, hours): RollingMean(hours * 3600)
+            for pollutant in pollutants
+            for hours in window_hours
+        }
+        self._window_hours = tuple(window_hours)
+
+    def add(
+        self,
+        pollutant: str,
+        timestamp: float,
+        value: float,
+        weight: float = 1.0,
+        window_hours: Iterable[int] | None = None,
+    ) -> None:
+        """Add a measurement to all windows, or only to given ones."""
+        for hours in self._window_hours if window_hours is None else window_hours:
+            if (rolling_mean := self._means.get((pollutant, hours))) is not None:
+                rolling_mean.add(timestamp, value, weight)
+
+    def add_values(self, values: Mapping[str, float | None], timestamp: float) -> None:
+        """Add measurements of all pollutants taken at the same time."""
+        for pollutant, value in values.items():
+            if value is not None:
+                self.add(pollutant, timestamp, value)
+
+    def as_dict(self) -> dict[str, dict[str, list[list[float]]]]:
+        """Get state of all windows in a JSON serializable form."""
+        data: dict[str, dict[str, list[list[float]]]] = {}
+        for (pollutant, hours), rolling_mean in self._means.items():
+            if buckets := rolling_mean.as_list():
+                data.setdefault(pollutant, {})[str(hours)] = buckets
+        return data
+
+    def restore(self, data: Mapping[str, Mapping[str, list[list[float]]]]) -> None:
+        """Restore windows saved with as_dict, unknown ones are skipped."""
+        for pollutant, windows in data.items():
+            for hours, buckets in windows.items():
+                if (
+                    rolling_mean := self._means.get((pollutant, int(hours)))
+                ) is not None:
+                    rolling_mean.restore(buckets)
+
+    def mean(self, pollutant: str, hours: int, timestamp: float) -> float | None:
+        """Get mean of the pollutant over the last hours."""
+        if (rolling_mean := self._means.get((pollutant, hours))) is None:
+            return None
+        return rolling_mean.mean(timestamp)
+
+
+def replay_states(
+    states: Iterable[tuple[float, float | None]], end: float, interval: float
+) -> Iterator[tuple[float, float, float]]:
+    """
+    Turn recorded state changes into (timestamp, value, weight) samples.
+
+    Recorder keeps only changes, so each state is repeated every interval
+    until the next one, as if the coordinator fetched it. States without a
+    value break the series.
+    """
+    previous: tuple[float, float] | None = None
+    for timestamp, value in (*states, (end, None)):
+        if previous is not None:
+            start, previous_value = previous
+            while start < timestamp:
+                yield start, previous_value, min(timestamp - start, interval) / interval
+                start += interval
+        previous = None if value is None else (timestamp, value)
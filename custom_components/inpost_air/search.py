@@ -0,0 +1,62 @@
+"""Text search over parcel lockers."""
+
+from __future__ import annotations
+
+import unicodedata
+from array import array
+from bisect import bisect_right
+from collections.abc import Iterable, Iterator
+
+_SEPARATOR = "\n"
+_TRANSLATION = str.maketrans({"ł": "l", _SEPARATOR: " "})
+
+
+def normalize(text: str) -> str:
+    """Lowercase text and strip diacritics, so "Łódź" matches "lodz"."""
+    decomposed = unicodedata.normalize("NFKD", text.casefold().translate(_TRANSLATION))
+    return "".join(char for char in decomposed if not unicodedata.combining(char))
+
+
+class SubstringIndex:
+    """
+    Substring index over short texts.
+
+    All texts are normalized and joined into a single string, so a query is
+    a handful of C-level `str.find` calls and a bisect per match instead of
+    a Python loop over every text.
+    """
+
+    def __init__(self, texts: Iterable[str]) -> None:
+        """Init class."""
+        offsets = array("i")
+        parts = []
+        position = 0
+        for text in texts:
+            normalized = normalize(text)
+            offsets.append(position)
+            parts.append(normalized)
+            position += len(normalized) + 1
+
+        self._offsets = offsets
+        self._haystack = _SEPARATOR.join(parts)
+
+    def __len__(self) -> int:
+        """Get number of indexed texts."""
+        return len(self._offsets)
+
+    def search(self, query: str) -> Iterator[int]:
+        """Get indices of texts containing the query, in index order."""
+        if not (needle := normalize(query).strip()):
+            return
+
+        haystack = self._haystack
+        offsets = self._offsets
+        position = haystack.find(needle)
+        while position != -1:
+            index = bisect_right(offsets, position) - 1
+            yield index
+            # Skip rest of the text so it's not reported twice
+            next_text = offsets[index + 1] if index + 1 < len(offsets) else None
+            if next_text is None:
+                return
+            position = haystack.find(needle, next_text)
@@ -8,6 +8,7 @@ from homeassistant.const import (
     UnitOfTemperature,
 )
 from homeassistant.core import HomeAssistant
+from homeassistant.helpers import entity_registry as er
 from homeassistant.helpers.entity_platform import AddEntitiesCallback
 from custom_components.inpost_air import InPostAirConfiEntry
 from custom_components.inpost_air.coordinator import ValueWithNorm
@@ -130,17 +131,35 @@ async def async_setup_entry(
     parcel_locker = entry.runtime_data.parcel_locker
     coordinator = entry.runtime_data.coordinator
 
+    if coordinator.data is not None:
+        descriptions = [
+            description
+            for description in PARCEL_LOCKER_SENSORS
+            if description.exists_fn(coordinator.data)
+        ]
+    else:
+        # Setup didn't wait for data, add sensors registered before
+        unique_ids = {
+            entity.unique_id
+            for entity in er.async_entries_for_config_entry(
+                er.async_get(hass), entry.entry_id
+            )
+        }
+        descriptions = [
+            description
+            for description in PARCEL_LOCKER_SENSORS
+            if f"{parcel_locker.locker_code}_{description.key}" in unique_ids
+        ]
+
     base_sensors = [
         ParcelLockerSensor(coordinator, parcel_locker, description)
-        for description in PARCEL_LOCKER_SENSORS
-        if description.exists_fn(coordinator.data)
+        for description in descriptions
     ]
 
     async_add_entities(
         [
             *base_sensors,
-            PolishAirQualityIndexSensor(parcel_locker),
-            EuropeanAirQualityIndexSensor(parcel_locker),
-        ],
-        update_before_add=True,
+            PolishAirQualityIndexSensor(coordinator, parcel_locker),
+            EuropeanAirQualityIndexSensor(coordinator, parcel_locker),
+        ]
     )
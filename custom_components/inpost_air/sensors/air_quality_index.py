@@ -1,96 +1,107 @@
 from abc import abstractmethod
-from datetime import timedelta
+from datetime import datetime
 
-from homeassistant.components import recorder
-from homeassistant.components.recorder import history
 from homeassistant.components.sensor import SensorEntity
-from homeassistant.helpers import device_registry, entity_registry
+from homeassistant.core import CALLBACK_TYPE, callback
+from homeassistant.helpers.event import async_call_later
+from homeassistant.helpers.update_coordinator import CoordinatorEntity
 from homeassistant.util import dt as dt_util
 
 from custom_components.inpost_air import utils
 from custom_components.inpost_air.models import ParcelLocker
 from custom_components.inpost_air.const import Entities
+from custom_components.inpost_air.coordinator import (
+    UPDATE_INTERVAL,
+    InPostAirDataCoordinator,
+)
 
 
-class AirQualityIndexSensor(SensorEntity):
+class AirQualityIndexSensor(CoordinatorEntity, SensorEntity):
     """
     Represents a sensor for measuring air quality index.
+
+    The index is recalculated from rolling means kept by the coordinator, only
+    when it fetches new data. As it describes the last hours, not the last
+    poll, the sensor keeps its value when polls fail. Meanwhile it's
+    recalculated every UPDATE_INTERVAL on its own, as the coordinator doesn't
+    notify about repeated failures, and becomes unavailable once there are
+    no measurements left in the rolling windows.
     """
 
     _attr_has_entity_name = True
 
     def __init__(
         self,
+        coordinator: InPostAirDataCoordinator,
         parcel_locker: ParcelLocker,
     ) -> None:
+        super().__init__(coordinator, context=parcel_locker)
         self._attr_device_info = utils.get_device_info(parcel_locker)
         self._attr_icon = "mdi:air-filter"
+        self._cancel_recalculation: CALLBACK_TYPE | None = None
+
+    @property
+    def available(self) -> bool:
+        """Return True while the index can be calculated, even if last poll failed."""
+        return self._attr_native_value is not None or super().available
 
     @abstractmethod
-    async def async_update(self) -> None:
+    def update_index(self) -> None:
         """
         Update sensor's state
         """
 
-    def get_last_n_hours_data(self, entity_id, n: int):
-        """
-        Retrieve the last n hours of data for a given entity.
-        """
-        raw_states = history.state_changes_during_period(
-            hass=self.hass,
-            start_time=dt_util.utcnow() - timedelta(hours=n),
-            end_time=dt_util.utcnow(),
-            entity_id=entity_id,
-        ).get(entity_id, [])
+    async def async_added_to_hass(self) -> None:
+        """Calculate index when sensor is added."""
+        await super().async_added_to_hass()
+        self.update_index()
+        task = self.hass.async_create_task(
+            self._async_seed_and_update_index(),
+            f"{self.entity_id} rolling means seed",
+        )
+        self.async_on_remove(task.cancel)
+        self.async_on_remove(self._async_cancel_recalculation)
 
-        return [
-            float(item.state) for item in raw_states if utils.can_be_float(item.state)
-        ]
+    async def _async_seed_and_update_index(self) -> None:
+        """Recalculate index once measurements from before setup are loaded."""
+        await self.coordinator.async_seed_aggregator()
+        self.update_index()
+        self.async_write_ha_state()
+
+    @callback
+    def _handle_coordinator_update(self) -> None:
+        self.update_index()
+        self.async_write_ha_state()
+
+        self._async_cancel_recalculation()
+        if not self.coordinator.last_update_success and self.available:
+            self._cancel_recalculation = async_call_later(
+                self.hass, UPDATE_INTERVAL, self._async_recalculate
+            )
 
-    async def get_sensors_data(
+    @callback
+    def _async_recalculate(self, _now: datetime) -> None:
+        """Recalculate index from rolling means while polls keep failing."""
+        self._cancel_recalculation = None
+        self._handle_coordinator_update()
+
+    @callback
+    def _async_cancel_recalculation(self) -> None:
+        """Cancel scheduled recalculation."""
+        if self._cancel_recalculation is not None:
+            self._cancel_recalculation()
+            self._cancel_recalculation = None
+
+    def get_means(
         self, sensors: list[tuple[Entities, int]]
-    ) -> list[tuple[Entities, list[float]]]:
+    ) -> list[tuple[Entities, float]]:
         """
-        Retrieves data from sensors for the specified time period.
+        Get mean values of sensors over the specified number of hours.
         """
-        device = device_registry.async_get(self.hass).async_get_device(
-            identifiers=self.device_info.get("identifiers")
-            if self.device_info is not None
-            else None,
-            connections=self.device_info.get("connections")
-            if self.device_info is not None
-            else None,
-        )
-
-        if device is None:
-            return []
-
-        entities = dict(
-            map(
-                lambda entity: (
-                    ""
-                    if entity.translation_key is None
-                    else entity.translation_key.upper(),
-                    entity,
-                ),
-                entity_registry.async_entries_for_device(
-                    registry=entity_registry.async_get(self.hass), device_id=device.id
-                ),
-            )
-        )
-        available_entities = [
-            (entities[entity_key], hours)
-            for (entity_key, hours) in sensors
-            if entity_key in entities
+        now = dt_util.utcnow().timestamp()
+        return [
+            (entity, mean)
+            for (entity, hours) in sensors
+            if (mean := self.coordinator.aggregator.mean(entity, hours, now))
+            is not None
         ]
-        values = await recorder.get_instance(self.hass).async_add_executor_job(  # type: ignore
-            lambda: [
-                (
-                    Entities(entity.translation_key.upper()),  # type: ignore
-                    self.get_last_n_hours_data(entity.entity_id, hours),
-                )
-                for (entity, hours) in available_entities
-            ]
-        )
-
-        return values
@@ -1,7 +1,7 @@
 from enum import IntEnum, auto
-import statistics
 from custom_components.inpost_air.models import ParcelLocker
 from custom_components.inpost_air.const import Entities
+from custom_components.inpost_air.coordinator import InPostAirDataCoordinator
 from custom_components.inpost_air.sensors.air_quality_index import AirQualityIndexSensor
 
 
@@ -23,8 +23,10 @@ class EuropeanAirQualityIndexSensor(AirQualityIndexSensor):
     Represents a sensor for calculating the European Air Quality Index.
     """
 
-    def __init__(self, parcel_locker: ParcelLocker) -> None:
-        super().__init__(parcel_locker)
+    def __init__(
+        self, coordinator: InPostAirDataCoordinator, parcel_locker: ParcelLocker
+    ) -> None:
+        super().__init__(coordinator, parcel_locker)
         self._attr_name = "European Air Quality Index"
         self._attr_unique_id = f"{parcel_locker.locker_code}_eaqi"
 
@@ -88,8 +90,8 @@ class EuropeanAirQualityIndexSensor(AirQualityIndexSensor):
                 if value > 340:
                     return EuropeanAirQualityIndexCategory.EXTREMELY_POOR
 
-    async def async_update(self) -> None:
-        sensors_data = await self.get_sensors_data(
+    def update_index(self) -> None:
+        mean_data = self.get_means(
             [
                 (Entities.PM2_5, 24),
                 (Entities.PM10, 24),
@@ -97,9 +99,6 @@ class EuropeanAirQualityIndexSensor(AirQualityIndexSensor):
                 (Entities.O3, 1),
             ]
         )
-        mean_data = [
-            (entity, statistics.fmean(x)) for (entity, x) in sensors_data if len(x) > 0
-        ]
         sub_indices = [
             sub_index
             for sub_index in map(self.calculate_sub_index, mean_data)
@@ -1,8 +1,8 @@
-import statistics
 from enum import IntEnum, auto
 
 from custom_components.inpost_air.models import ParcelLocker
 from custom_components.inpost_air.const import Entities
+from custom_components.inpost_air.coordinator import InPostAirDataCoordinator
 from custom_components.inpost_air.sensors.air_quality_index import AirQualityIndexSensor
 
 
@@ -24,8 +24,10 @@ class PolishAirQualityIndexSensor(AirQualityIndexSensor):
     Represents a sensor for calculating the Polish Air Quality Index.
     """
 
-    def __init__(self, parcel_locker: ParcelLocker) -> None:
-        super().__init__(parcel_locker)
+    def __init__(
+        self, coordinator: InPostAirDataCoordinator, parcel_locker: ParcelLocker
+    ) -> None:
+        super().__init__(coordinator, parcel_locker)
         self._attr_name = "Polish Air Quality Index"
         self._attr_unique_id = f"{parcel_locker.locker_code}_paqi"
 
@@ -89,8 +91,8 @@ class PolishAirQualityIndexSensor(AirQualityIndexSensor):
                 if value > 400:
                     return PolishAirQualityIndexCategory.VERY_BAD
 
-    async def async_update(self) -> None:
-        sensors_data = await self.get_sensors_data(
+    def update_index(self) -> None:
+        mean_data = self.get_means(
             [
                 (Entities.PM2_5, 1),
                 (Entities.PM10, 1),
@@ -98,9 +100,6 @@ class PolishAirQualityIndexSensor(AirQualityIndexSensor):
                 (Entities.O3, 1),
             ]
         )
-        mean_data = [
-            (entity, statistics.fmean(x)) for (entity, x) in sensors_data if len(x) > 0
-        ]
         sub_indices = [
             sub_index
             for sub_index in map(self.calculate_sub_index, mean_data)
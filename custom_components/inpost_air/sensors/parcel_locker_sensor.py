@@ -58,9 +58,18 @@ class ParcelLockerSensor(CoordinatorEntity, SensorEntity):
         self._attr_translation_key = entity_description.key.lower()
         self._attr_device_info = get_device_info(device)
 
+    async def async_added_to_hass(self) -> None:
+        """Set state from already fetched data when sensor is added."""
+        await super().async_added_to_hass()
+        if self.coordinator.data is not None:
+            self._attr_native_value = self.entity_description.value_fn(
+                self.coordinator.data
+            )
+
     @callback
     def _handle_coordinator_update(self) -> None:
-        self._attr_native_value = self.entity_description.value_fn(
-            self.coordinator.data
-        )
+        if self.coordinator.data is not None:
+            self._attr_native_value = self.entity_description.value_fn(
+                self.coordinator.data
+            )
         self.async_write_ha_state()
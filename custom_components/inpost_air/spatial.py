@@ -0,0 +1,152 @@
+"""Spatial index of parcel lockers."""
+
+from __future__ import annotations
+
+import heapq
+from array import array
+from collections.abc import Sequence
+from math import cos, floor, radians
+
+from custom_components.inpost_air.utils import haversine_many
+
+KM_PER_DEGREE = 111.19
+DEFAULT_CELL_SIZE = 0.1
+
+
+class GridIndex:
+    """
+    Uniform latitude/longitude grid over parcel locker coordinates.
+
+    Answers nearest and within-radius queries by looking only at grid cells
+    around the queried point instead of the whole catalog.
+    """
+
+    def __init__(
+        self,
+        latitudes: Sequence[float],
+        longitudes: Sequence[float],
+        cell_size: float = DEFAULT_CELL_SIZE,
+    ) -> None:
+        """Init class."""
+        self._latitudes = latitudes
+        self._longitudes = longitudes
+        self._cell_size = cell_size
+        self._cells: dict[tuple[int, int], array] = {}
+
+        for index, (latitude, longitude) in enumerate(
+            zip(latitudes, longitudes, strict=True)
+        ):
+            cell = self._cell(latitude, longitude)
+            if (rows := self._cells.get(cell)) is None:
+                rows = self._cells[cell] = array("i")
+            rows.append(index)
+
+        self._bounds = (0, 0, 0, 0)
+        if self._cells:
+            ys, xs = zip(*self._cells, strict=True)
+            self._bounds = (min(ys), max(ys), min(xs), max(xs))
+
+    def __len__(self) -> int:
+        """Get number of indexed points."""
+        return len(self._latitudes)
+
+    def _cell(self, latitude: float, longitude: float) -> tuple[int, int]:
+        """Get grid cell containing given point."""
+        return (
+            floor(latitude / self._cell_size),
+            floor(longitude / self._cell_size),
+        )
+
+    def distances(
+        self, latitude: float, longitude: float, rows: Sequence[int]
+    ) -> list[tuple[float, int]]:
+        """Get (distance in km, row) from given point to given rows."""
+        distances = haversine_many(
+            longitude,
+            latitude,
+            [self._longitudes[row] for row in rows],
+            [self._latitudes[row] for row in rows],
+        )
+        return list(zip(distances, rows, strict=True))
+
+    def _ring_range(self, cell: tuple[int, int]) -> range:
+        """Get range of rings around given cell that contain any points."""
+        y, x = cell
+        y_min, y_max, x_min, x_max = self._bounds
+        first = max(0, y_min - y, y - y_max, x_min - x, x - x_max)
+        last = max(abs(y - y_min), abs(y - y_max), abs(x - x_min), abs(x - x_max))
+        return range(first, last + 1)
+
+    def _ring_rows(self, cell: tuple[int, int], ring: int) -> list[int]:
+        """Get rows from cells lying exactly `ring` cells away from given cell."""
+        y, x = cell
+        if ring == 0:
+            return list(self._cells.get(cell, ()))
+
+        rows: list[int] = []
+        if 8 * ring > len(self._cells):
+            for (cell_y, cell_x), cell_rows in self._cells.items():
+                if max(abs(cell_y - y), abs(cell_x - x)) == ring:
+                    rows.extend(cell_rows)
+            return rows
+
+        for dy in range(-ring, ring + 1):
+            step = 1 if abs(dy) == ring else 2 * ring
+            for dx in range(-ring, ring + 1, step):
+                rows.extend(self._cells.get((y + dy, x + dx), ()))
+        return rows
+
+    def _ring_min_distance(self, latitude: float, ring: int) -> float:
+        """Get lower bound of distance to any point outside of first `ring` rings."""
+        farthest_latitude = min(abs(latitude) + (ring + 1) * self._cell_size, 89.9)
+        return ring * self._cell_size * KM_PER_DEGREE * cos(radians(farthest_latitude))
+
+    def nearest(
+        self, latitude: float, longitude: float, k: int | None = None
+    ) -> list[tuple[float, int]]:
+        """Get (distance in km, row) of `k` nearest points, all points if k is None."""
+        if k is None or k >= len(self):
+            return sorted(
+                self.distances(latitude, longitude, range(len(self))),
+            )
+
+        cell = self._cell(latitude, longitude)
+        candidates: list[tuple[float, int]] = []
+        for ring in self._ring_range(cell):
+            candidates.extend(
+                self.distances(latitude, longitude, self._ring_rows(cell, ring))
+            )
+            if len(candidates) >= k:
+                candidates = heapq.nsmallest(k, candidates)
+                if candidates[-1][0] <= self._ring_min_distance(latitude, ring):
+                    break
+
+        return sorted(candidates)[:k]
+
+    def within(
+        self, latitude: float, longitude: float, radius: float
+    ) -> list[tuple[float, int]]:
+        """Get (distance in km, row) of points within `radius` km, nearest first."""
+        latitude_span = radius / KM_PER_DEGREE
+        farthest_latitude = min(abs(latitude) + latitude_span, 89.9)
+        longitude_span = min(
+            radius / (KM_PER_DEGREE * cos(radians(farthest_latitude))), 180
+        )
+        y_min, x_min = self._cell(latitude - latitude_span, longitude - longitude_span)
+        y_max, x_max = self._cell(latitude + latitude_span, longitude + longitude_span)
+
+        rows: list[int] = []
+        if (y_max - y_min + 1) * (x_max - x_min + 1) > len(self._cells):
+            for (y, x), cell_rows in self._cells.items():
+                if y_min <= y <= y_max and x_min <= x <= x_max:
+                    rows.extend(cell_rows)
+        else:
+            for y in range(y_min, y_max + 1):
+                for x in range(x_min, x_max + 1):
+                    rows.extend(self._cells.get((y, x), ()))
+
+        return sorted(
+            item
+            for item in self.distances(latitude, longitude, rows)
+            if item[0] <= radius
+        )
@@ -0,0 +1,112 @@
+"""Incremental decoding of large responses."""
+
+from __future__ import annotations
+
+import codecs
+import json
+import re
+from typing import Any
+
+from aiohttp import StreamReader
+
+CHUNK_SIZE = 64 * 1024
+MAX_HEADER_LENGTH = 4 * 1024
+_WHITESPACE_AND_SEPARATORS = " \t\r\n,"
+
+
+class JsonArrayItemsParser:
+    """
+    Decodes items of a top-level JSON array one at a time.
+
+    Bytes are fed in arbitrary chunks, only the currently decoded item is kept
+    in the buffer. Scalar fields placed before the array are available in
+    `header` once the array starts.
+    """
+
+    def __init__(self, key: str) -> None:
+        """Init class."""
+        self._marker = re.compile(rf'"{re.escape(key)}"\s*:\s*\[')
+        self._marker_overlap = len(key) + 16
+        self._text_decoder = codecs.getincrementaldecoder("utf-8")()
+        self._json_decoder = json.JSONDecoder()
+        self._buffer = ""
+        self._prefix = ""
+        self._in_array = False
+        self.header: dict[str, Any] = {}
+        self.done = False
+
+    def feed(self, chunk: bytes) -> list[Any]:
+        """Feed next chunk of the document and get all items completed by it."""
+        if self.done:
+            return []
+
+        self._buffer += self._text_decoder.decode(chunk)
+        if not self._in_array and not self._find_array_start():
+            return []
+
+        items = []
+        buffer = self._buffer
+        position = 0
+        length = len(buffer)
+        while True:
+            while position < length and buffer[position] in _WHITESPACE_AND_SEPARATORS:
+                position += 1
+            if position >= length:
+                break
+            if buffer[position] == "]":
+                self.done = True
+                break
+            try:
+                item, position = self._json_decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                # Item is not complete yet, wait for more data
+                break
+            items.append(item)
+
+        self._buffer = "" if self.done else buffer[position:]
+        return items
+
+    def _find_array_start(self) -> bool:
+        """Skip the document up to the array, keeping scalar fields before it."""
+        if (match := self._marker.search(self._buffer)) is None:
+            keep = max(len(self._buffer) - self._marker_overlap, 0)
+            self._prefix = (self._prefix + self._buffer[:keep])[:MAX_HEADER_LENGTH]
+            self._buffer = self._buffer[keep:]
+            return False
+
+        self._in_array = True
+        self.header = self._decode_header(self._prefix + self._buffer[: match.start()])
+        self._prefix = ""
+        self._buffer = self._buffer[match.end() :]
+        return True
+
+    def _decode_header(self, prefix: str) -> dict[str, Any]:
+        """Decode scalar fields preceding the array, if there are any."""
+        try:
+            header = json.loads(prefix.rstrip(_WHITESPACE_AND_SEPARATORS) + "}")
+        except json.JSONDecodeError:
+            return {}
+        return header if isinstance(header, dict) else {}
+
+
+async def async_search_stream(
+    stream: StreamReader,
+    pattern: re.Pattern[str],
+    overlap: int,
+    chunk_size: int = CHUNK_SIZE,
+) -> re.Match[str] | None:
+    """
+    Search text read from the stream for the pattern, stopping at first match.
+
+    Last `overlap` characters of each chunk are searched again together with
+    the next one, so it must be longer than any possible match.
+    """
+    text_decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    tail = ""
+    async for chunk in stream.iter_chunked(chunk_size):
+        text = tail + text_decoder.decode(chunk)
+        if (match := pattern.search(text)) is not None:
+            return match
+        tail = text[-overlap:]
+
+    return pattern.search(tail + text_decoder.decode(b"", final=True))
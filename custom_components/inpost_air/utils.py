@@ -1,4 +1,10 @@
+import hashlib
+import time
+from array import array
+from collections import OrderedDict
+from collections.abc import Hashable, Sequence
 from math import asin, cos, radians, sin, sqrt
+from typing import Any
 
 from homeassistant.helpers.device_registry import DeviceInfo
 from slugify import slugify
@@ -25,6 +31,152 @@ def haversine(lon1, lat1, lon2, lat2):
     return km
 
 
+def haversine_many(
+    lon: float, lat: float, lons: Sequence[float], lats: Sequence[float]
+) -> array:
+    """
+    Calculate the great circle distances between one point and many points
+    on the earth (specified in decimal degrees) in a single pass
+    """
+    lon1, lat1 = radians(lon), radians(lat)
+    cos_lat1 = cos(lat1)
+
+    # 12742 is the diameter of earth in kilometers
+    return array(
+        "d",
+        (
+            12742
+            * asin(
+                sqrt(
+                    sin((radians(lat2) - lat1) / 2) ** 2
+                    + cos_lat1
+                    * cos(radians(lat2))
+                    * sin((radians(lon2) - lon1) / 2) ** 2
+                )
+            )
+            for lon2, lat2 in zip(lons, lats, strict=True)
+        ),
+    )
+
+
+class ExpiringLRUCache:
+    """
+    Bounded least recently used cache with per-entry time to live.
+    """
+
+    def __init__(self, maxsize: int, ttl: float) -> None:
+        """Init class."""
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+
+    def __len__(self) -> int:
+        """Get number of stored entries, including expired ones."""
+        return len(self._entries)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Get value stored under key, or default if it's missing or expired."""
+        if (entry := self._entries.get(key)) is None:
+            return default
+
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            return default
+
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key: Hashable, value: Any, ttl: float | None = None) -> None:
+        """Store value under key, evicting least recently used entry if full."""
+        self._entries[key] = (
+            time.monotonic() + (self.ttl if ttl is None else ttl),
+            value,
+        )
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+
+class TokenBucket:
+    """
+    Limits rate of events to `rate` per second, allowing bursts of `capacity`.
+
+    Tokens are reserved in order of calls, so waiting callers are served
+    first come, first served without a lock.
+    """
+
+    def __init__(self, rate: float, capacity: float) -> None:
+        """Init class."""
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated_at = time.monotonic()
+
+    def reserve(self) -> float:
+        """Take a token, returns how many seconds to wait until it's available."""
+        now = time.monotonic()
+        self._tokens = min(
+            self.capacity, self._tokens + (now - self._updated_at) * self.rate
+        )
+        self._updated_at = now
+        self._tokens -= 1
+        return max(0.0, -self._tokens / self.rate)
+
+    def refund(self) -> None:
+        """Give back a reserved token which won't be used."""
+        self._tokens = min(self.capacity, self._tokens + 1)
+
+
+class CircuitBreaker:
+    """
+    Fails fast while a service is down.
+
+    After `threshold` consecutive failures the circuit opens and calls aren't
+    allowed. Every `reset_timeout` seconds a single probe call is let through
+    (half-open), its success closes the circuit again.
+    """
+
+    def __init__(self, threshold: int, reset_timeout: float) -> None:
+        """Init class."""
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at: float | None = None
+
+    @property
+    def is_open(self) -> bool:
+        """Check if calls are failing fast."""
+        return self._opened_at is not None
+
+    def allow(self) -> bool:
+        """Check if a call can be made, letting a probe through when it's time."""
+        if self._opened_at is None:
+            return True
+        if time.monotonic() - self._opened_at < self.reset_timeout:
+            return False
+        # Next probe waits for another timeout, even if this one never finishes
+        self._opened_at = time.monotonic()
+        return True
+
+    def record_success(self) -> None:
+        """Close the circuit."""
+        self._failures = 0
+        self._opened_at = None
+
+    def record_failure(self) -> None:
+        """Count a failure, opening the circuit once there are too many."""
+        self._failures += 1
+        if self._failures >= self.threshold and self._opened_at is None:
+            self._opened_at = time.monotonic()
+
+
+def stable_fraction(key: str) -> float:
+    """Map key to a number in [0, 1), unlike hash() it's the same after restart."""
+    digest = hashlib.blake2b(key.encode(), digest_size=8).digest()
+    return int.from_bytes(digest) / 2**64
+
+
 def can_be_float(element: str) -> bool:
     """
     Check if the given element can be converted to a float.
@@ -39,11 +191,17 @@ def can_be_float(element: str) -> bool:
 def get_device_info(parcel_locker: ParcelLocker) -> DeviceInfo:
     """
     Get the device information for a given parcel locker.
+
+    ID is left out until it's resolved, device is still found by the code.
     """
     return DeviceInfo(
         identifiers={
             (DOMAIN, parcel_locker.locker_code),
-            (DOMAIN, parcel_locker.locker_id),
+            *(
+                [(DOMAIN, parcel_locker.locker_id)]
+                if parcel_locker.locker_id is not None
+                else []
+            ),
         },
     )
 
@@ -1,7 +1,12 @@
 """Fixtures for testing."""
 
 import logging
+from typing import Any
+
 import pytest
+from dacite import from_dict
+
+from custom_components.inpost_air.models import InPostAirPoint
 
 disable_loggers = ["sqlalchemy.engine.Engine"]
 
@@ -15,3 +20,33 @@ def pytest_configure():
 @pytest.fixture(autouse=True)
 def auto_enable_custom_integrations(recorder_mock, enable_custom_integrations):
     pass
+
+
+@pytest.fixture
+def point_item() -> dict[str, Any]:
+    """Catalog item of the parcel locker used in tests."""
+    return {
+        "n": "AJE01BAPP",
+        "t": 1,
+        "d": "Market Dino",
+        "m": "",
+        "q": "",
+        "f": "006",
+        "c": "Andrzejewo",
+        "g": "andrzejewo",
+        "e": "Warszawska",
+        "r": "mazowieckie",
+        "o": "07-305",
+        "b": "62A",
+        "h": "24/7",
+        "i": "[]",
+        "l": {"a": 52.83679, "o": 22.20968},
+        "p": 0,
+        "s": 1,
+    }
+
+
+@pytest.fixture
+def mocked_point(point_item) -> InPostAirPoint:
+    """Parcel locker used in tests."""
+    return from_dict(InPostAirPoint, point_item)
@@ -0,0 +1,129 @@
+"""Air capability index tests."""
+
+from datetime import timedelta
+from unittest.mock import patch
+
+import pytest
+from homeassistant.util import dt as dt_util
+from pytest_homeassistant_custom_component.common import async_fire_time_changed
+
+from custom_components.inpost_air.air_index import (
+    NEGATIVE_TTL,
+    POSITIVE_TTL,
+    STORAGE_KEY,
+    UNKNOWN_ID_RETRY_DELAY,
+    async_get_air_index,
+)
+from custom_components.inpost_air.api import (
+    InPostAirApiClientError,
+    InPostAirApiClientSensorsMissingError,
+    InPostApi,
+    async_get_api_client,
+)
+from custom_components.inpost_air.catalog import CompactCatalog
+from custom_components.inpost_air.const import DOMAIN
+
+
+@pytest.fixture
+def catalog(point_item) -> CompactCatalog:
+    """Catalog of mocked parcel lockers."""
+    return CompactCatalog.from_items(
+        [{**point_item, "n": code} for code in ("AIR01", "NOAIR01", "NOID01", "DOWN01")]
+    )
+
+
+async def find_parcel_locker_id(point):
+    """Resolve IDs of mocked parcel lockers."""
+    if point.n == "DOWN01":
+        raise InPostAirApiClientError("Something really wrong happened!")
+    return None if point.n == "NOID01" else f"id-{point.n}"
+
+
+async def get_parcel_locker_air_data(locker_code, locker_id):
+    """Read air data of mocked parcel lockers."""
+    if locker_code == "NOAIR01":
+        raise InPostAirApiClientSensorsMissingError("Air sensors are not available")
+
+
+@pytest.mark.parametrize("expected_lingering_timers", [True])
+async def test_probe_records_air_capability(hass, freezer, catalog):
+    """Test probed lockers are remembered with separate TTLs for both results."""
+    air_index = async_get_air_index(hass)
+    with (
+        patch.object(InPostApi, "find_parcel_locker_id", wraps=find_parcel_locker_id),
+        patch.object(
+            InPostApi, "get_parcel_locker_air_data", wraps=get_parcel_locker_air_data
+        ) as get_air_data,
+    ):
+        air_index.async_probe(
+            async_get_api_client(hass), catalog, [*catalog.codes, "UNKNOWN01"]
+        )
+        # Probes over the burst wait for the rate limiter
+        await hass.async_block_till_done()
+        assert air_index.get("NOID01") is None
+        async_fire_time_changed(hass, dt_util.utcnow() + timedelta(seconds=10))
+        await hass.async_block_till_done()
+
+        assert air_index.get("AIR01") is True
+        assert air_index.get("NOAIR01") is False
+        # Missing ID doesn't mean missing sensors
+        assert air_index.get("NOID01") is None
+        # Failed probes can be retried
+        assert air_index.get("DOWN01") is None
+        assert get_air_data.call_count == 2
+
+        # Known lockers aren't probed again
+        air_index.async_probe(async_get_api_client(hass), catalog, catalog.codes)
+        await hass.async_block_till_done()
+        assert get_air_data.call_count == 2
+
+    freezer.tick(NEGATIVE_TTL)
+    assert air_index.get("AIR01") is True
+    assert air_index.get("NOAIR01") is None
+
+    freezer.tick(POSITIVE_TTL - NEGATIVE_TTL - timedelta(seconds=1))
+    assert air_index.get("AIR01") is True
+    freezer.tick(timedelta(seconds=1))
+    assert air_index.get("AIR01") is None
+
+
+async def test_index_loaded_from_disk(hass, hass_storage):
+    """Test stored results are loaded with their original check time."""
+    now = dt_util.utcnow().timestamp()
+    hass_storage[STORAGE_KEY] = {
+        "version": 1,
+        "key": STORAGE_KEY,
+        "data": {
+            "lockers": {
+                "AIR01": [True, now - 60],
+                "NOAIR01": [False, now - NEGATIVE_TTL.total_seconds()],
+            }
+        },
+    }
+    air_index = async_get_air_index(hass)
+    await air_index.async_load()
+
+    assert air_index.get("AIR01") is True
+    assert air_index.get("NOAIR01") is None
+    assert hass.data[DOMAIN]["air_index"] is air_index
+
+
+@pytest.mark.parametrize("expected_lingering_timers", [True])
+async def test_locker_without_id_probed_again_later(hass, freezer, catalog):
+    """Test locker which ID wasn't found is probed again after a delay."""
+    air_index = async_get_air_index(hass)
+    with patch.object(
+        InPostApi, "find_parcel_locker_id", wraps=find_parcel_locker_id
+    ) as find_id:
+        air_index.async_probe(async_get_api_client(hass), catalog, ["NOID01"])
+        await hass.async_block_till_done()
+        air_index.async_probe(async_get_api_client(hass), catalog, ["NOID01"])
+        await hass.async_block_till_done()
+        assert find_id.call_count == 1
+
+        freezer.tick(UNKNOWN_ID_RETRY_DELAY)
+        air_index.async_probe(async_get_api_client(hass), catalog, ["NOID01"])
+        await hass.async_block_till_done()
+        assert find_id.call_count == 2
+
+    assert air_index.get("NOID01") is None
@@ -1,11 +1,24 @@
+import asyncio
+from http import HTTPStatus
+from unittest.mock import patch
 import pytest
 import pytest_socket
 import os
-from custom_components.inpost_air.api import InPostApi
-from custom_components.inpost_air.models import (
-    InPostAirPoint,
-    InPostAirPointCoordinates,
+from pytest_homeassistant_custom_component.test_util.aiohttp import (
+    AiohttpClientMockResponse,
 )
+from custom_components.inpost_air.api import (
+    CIRCUIT_BREAKER_THRESHOLD,
+    EASYPACK24_POINTS_URL,
+    MAX_REQUESTS_BURST_PER_HOST,
+    PARCEL_LOCKERS_LIST_URL,
+    InPostAirApiClientError,
+    InPostAirApiClientSensorsMissingError,
+    InPostAirApiClientUnavailableError,
+    InPostApi,
+    request_deadline,
+)
+from custom_components.inpost_air.utils import get_parcel_locker_url
 
 
 @pytest.fixture()
@@ -33,28 +46,8 @@ async def test_parcel_locker_search(hass, _allow_inpost_requests):
 )
 @pytest.mark.parametrize("expected_lingering_timers", [True])
 @pytest.mark.api
-async def test_find_parcel_locker_id(hass, _allow_inpost_requests):
-    response = await InPostApi(hass).find_parcel_locker_id(
-        InPostAirPoint(
-            "AJE01BAPP",
-            1,
-            "Market Dino",
-            "",
-            "",
-            "006",
-            "Andrzejewo",
-            "andrzejewo",
-            "Warszawska",
-            "mazowieckie",
-            "07-305",
-            "62A",
-            "24/7",
-            "[]",
-            InPostAirPointCoordinates(52.83679, 22.20968),
-            0,
-            1,
-        )
-    )
+async def test_find_parcel_locker_id(hass, _allow_inpost_requests, mocked_point):
+    response = await InPostApi(hass).find_parcel_locker_id(mocked_point)
     assert response is not None
 
 
@@ -66,3 +59,163 @@ async def test_find_parcel_locker_id(hass, _allow_inpost_requests):
 async def test_air_data(hass, _allow_inpost_requests):
     response = await InPostApi(hass).get_parcel_locker_air_data("AJE01BAPP", "56311")
     assert response is not None
+
+
+async def test_identical_requests_share_response(hass, aioclient_mock):
+    """Test concurrent identical requests are sent once."""
+    url = "https://inpost.pl/shipx-point-data/56311/AJE01BAPP/air_index_level"
+    aioclient_mock.post(
+        url,
+        json={"message": "", "air_index_level": "GOOD", "air_sensors": ["PM1:3:"]},
+    )
+    api = InPostApi(hass)
+
+    first, second = await asyncio.gather(
+        api.get_parcel_locker_air_data("AJE01BAPP", "56311"),
+        api.get_parcel_locker_air_data("AJE01BAPP", "56311"),
+    )
+    assert first == second
+    assert aioclient_mock.call_count == 1
+
+    await api.get_parcel_locker_air_data("AJE01BAPP", "56311")
+    assert aioclient_mock.call_count == 2
+
+
+async def test_cancelled_caller_doesnt_cancel_shared_request(hass, aioclient_mock):
+    """Test request shared with a cancelled caller completes for the others."""
+    url = "https://inpost.pl/shipx-point-data/56311/AJE01BAPP/air_index_level"
+    aioclient_mock.post(url, status=404)
+    api = InPostApi(hass)
+
+    cancelled = asyncio.ensure_future(
+        api.get_parcel_locker_air_data("AJE01BAPP", "56311")
+    )
+    other = asyncio.ensure_future(api.get_parcel_locker_air_data("AJE01BAPP", "56311"))
+    await asyncio.sleep(0)
+    cancelled.cancel()
+
+    with pytest.raises(InPostAirApiClientSensorsMissingError):
+        await other
+    assert aioclient_mock.call_count == 1
+
+
+@patch("custom_components.inpost_air.api.RETRY_BACKOFF", 0)
+async def test_transient_errors_are_retried(hass, aioclient_mock):
+    """Test idempotent requests are retried, until the host is considered down."""
+    url = "https://inpost.pl/shipx-point-data/56311/AJE01BAPP/air_index_level"
+    responses = [HTTPStatus.SERVICE_UNAVAILABLE, HTTPStatus.OK]
+
+    async def respond(method, url, data):
+        return AiohttpClientMockResponse(
+            method,
+            url,
+            status=responses.pop(0),
+            json={"message": "", "air_index_level": "GOOD", "air_sensors": []},
+        )
+
+    aioclient_mock.post(url, side_effect=respond)
+    api = InPostApi(hass)
+
+    assert (
+        await api.get_parcel_locker_air_data("AJE01BAPP", "56311")
+    ).air_sensors == []
+    assert aioclient_mock.call_count == 2
+
+    responses = [HTTPStatus.SERVICE_UNAVAILABLE] * CIRCUIT_BREAKER_THRESHOLD
+    with pytest.raises(InPostAirApiClientError):
+        await api.get_parcel_locker_air_data("AJE01BAPP", "56311")
+    assert aioclient_mock.call_count == 5
+
+    # Circuit breaker opened after 5 consecutive failures
+    with pytest.raises(InPostAirApiClientUnavailableError):
+        await api.get_parcel_locker_air_data("AJE01BAPP", "56311")
+    assert aioclient_mock.call_count == 7
+    assert not responses
+
+
+async def test_requests_queued_by_limits_dont_open_circuit(hass, aioclient_mock):
+    """Test requests timing out while waiting for the rate limit aren't failures."""
+    requests = CIRCUIT_BREAKER_THRESHOLD + MAX_REQUESTS_BURST_PER_HOST
+    for locker_id in range(requests + 1):
+        aioclient_mock.post(
+            f"https://inpost.pl/shipx-point-data/{locker_id}/AJE01BAPP/air_index_level",
+            json={"message": "", "air_index_level": "GOOD", "air_sensors": []},
+        )
+    api = InPostApi(hass)
+
+    with request_deadline(0.1):
+        results = await asyncio.gather(
+            *(
+                api.get_parcel_locker_air_data("AJE01BAPP", str(locker_id))
+                for locker_id in range(requests)
+            ),
+            return_exceptions=True,
+        )
+
+    # Only requests within the burst were sent, the rest timed out in the queue
+    assert aioclient_mock.call_count == MAX_REQUESTS_BURST_PER_HOST
+    assert [str(result) for result in results if isinstance(result, Exception)] == [
+        "Request timed out"
+    ] * CIRCUIT_BREAKER_THRESHOLD
+
+    # Circuit stays closed and tokens of abandoned requests were given back
+    await api.get_parcel_locker_air_data("AJE01BAPP", str(requests))
+    assert aioclient_mock.call_count == MAX_REQUESTS_BURST_PER_HOST + 1
+
+
+@patch("custom_components.inpost_air.api.HEDGE_DELAY", 0)
+async def test_search_doesnt_wait_for_catalog(hass, aioclient_mock):
+    """Test easypack24 answer is used while catalog is still downloading."""
+    download_cancelled = asyncio.Event()
+
+    async def slow_catalog(method, url, data):
+        try:
+            await asyncio.Event().wait()
+        finally:
+            download_cancelled.set()
+
+    aioclient_mock.get(PARCEL_LOCKERS_LIST_URL, side_effect=slow_catalog)
+    aioclient_mock.get(
+        EASYPACK24_POINTS_URL + "AJE01BAPP",
+        json={
+            "name": "AJE01BAPP",
+            "location_description": "Market Dino",
+            "address_details": {"city": "Andrzejewo", "street": "Warszawska"},
+            "location": {"latitude": 52.83679, "longitude": 22.20968},
+        },
+    )
+
+    parcel_locker = await InPostApi(hass).search_parcel_locker("AJE01BAPP")
+
+    assert parcel_locker.n == "AJE01BAPP"
+    assert parcel_locker.c == "Andrzejewo"
+    await download_cancelled.wait()
+
+
+async def test_locker_id_resolved_from_page(hass, aioclient_mock, mocked_point):
+    """Test ID is scanned from the parcel locker page."""
+    aioclient_mock.get(
+        get_parcel_locker_url(mocked_point),
+        text='<div data-shipx-url="/shipx-point-data/56311/AJE01BAPP/air_index_level">',
+    )
+    api = InPostApi(hass)
+
+    assert await api.find_parcel_locker_id(mocked_point) == "56311"
+    assert aioclient_mock.call_count == 1
+
+
+async def test_concurrent_locker_id_lookups_share_page(
+    hass, aioclient_mock, mocked_point
+):
+    """Test concurrent lookups of the same parcel locker scan its page once."""
+    aioclient_mock.get(
+        get_parcel_locker_url(mocked_point),
+        text='<div data-shipx-url="/shipx-point-data/56311/AJE01BAPP/air_index_level">',
+    )
+    api = InPostApi(hass)
+
+    assert await asyncio.gather(
+        api.find_parcel_locker_id(mocked_point),
+        api.find_parcel_locker_id(mocked_point),
+    ) == ["56311", "56311"]
+    assert aioclient_mock.call_count == 1
@@ -0,0 +1,249 @@
+"""Parcel lockers catalog tests."""
+
+from http import HTTPStatus
+from unittest.mock import patch
+
+import pytest
+from dacite import from_dict
+
+from custom_components.inpost_air.api import (
+    EASYPACK24_POINTS_URL,
+    PARCEL_LOCKERS_LIST_URL,
+    InPostAirApiClientError,
+    InPostApi,
+    _parse_catalog_batch,
+)
+from custom_components.inpost_air.catalog import (
+    CompactCatalog,
+    async_get_catalog_cache,
+)
+from custom_components.inpost_air.decoder import DecodeError, dataclass_decoder
+from custom_components.inpost_air.models import InPostAirPoint
+
+
+@pytest.fixture
+def mocked_catalog(point_item):
+    """Catalog document with a single parcel locker."""
+    return {"date": "2024-06-01", "page": 1, "total_pages": 1, "items": [point_item]}
+
+
+@pytest.mark.parametrize("expected_lingering_timers", [True])
+async def test_catalog_served_from_memory(hass, aioclient_mock, mocked_catalog):
+    """Test catalog is downloaded only once within TTL."""
+    aioclient_mock.get(PARCEL_LOCKERS_LIST_URL, json=mocked_catalog)
+
+    api_client = InPostApi(hass)
+    lockers = await api_client.get_parcel_lockers_list()
+    parcel_locker = await InPostApi(hass).search_parcel_locker("AJE01BAPP")
+
+    assert [locker.n for locker in lockers] == ["AJE01BAPP"]
+    assert parcel_locker is not None
+    assert parcel_locker.l.a == 52.83679
+    assert aioclient_mock.call_count == 1
+
+
+@pytest.mark.parametrize("expected_lingering_timers", [True])
+async def test_catalog_revalidated_when_expired(hass, aioclient_mock, mocked_catalog):
+    """Test expired catalog is revalidated with conditional request."""
+    aioclient_mock.get(
+        PARCEL_LOCKERS_LIST_URL,
+        json=mocked_catalog,
+        headers={"ETag": '"v1"', "Last-Modified": "Sat, 01 Jun 2024 00:00:00 GMT"},
+    )
+    await InPostApi(hass).get_parcel_lockers_list()
+
+    catalog = async_get_catalog_cache(hass)
+    catalog.fetched_at = 0
+    aioclient_mock.clear_requests()
+    aioclient_mock.get(PARCEL_LOCKERS_LIST_URL, status=HTTPStatus.NOT_MODIFIED)
+
+    lockers = await InPostApi(hass).get_parcel_lockers_list()
+
+    assert [locker.n for locker in lockers] == ["AJE01BAPP"]
+    assert catalog.is_fresh
+    assert aioclient_mock.mock_calls[0][3] == {
+        "If-None-Match": '"v1"',
+        "If-Modified-Since": "Sat, 01 Jun 2024 00:00:00 GMT",
+    }
+
+
+async def test_search_streams_catalog_when_not_cached(
+    hass, aioclient_mock, mocked_catalog
+):
+    """Test parcel locker is searched in streamed catalog when cache is empty."""
+    aioclient_mock.get(PARCEL_LOCKERS_LIST_URL, json=mocked_catalog)
+
+    parcel_locker = await InPostApi(hass).search_parcel_locker("AJE01BAPP")
+
+    assert parcel_locker is not None
+    assert parcel_locker.d == "Market Dino"
+    assert async_get_catalog_cache(hass).catalog is None
+
+
+@pytest.mark.parametrize("expected_lingering_timers", [True])
+@pytest.mark.parametrize(
+    "revalidation",
+    [{"status": HTTPStatus.NOT_MODIFIED}, {"exc": TimeoutError}],
+)
+async def test_search_revalidates_expired_catalog(
+    hass, aioclient_mock, mocked_catalog, revalidation
+):
+    """Test search uses expired catalog when it's not modified or can't be checked."""
+    aioclient_mock.get(
+        PARCEL_LOCKERS_LIST_URL, json=mocked_catalog, headers={"ETag": '"v1"'}
+    )
+    await InPostApi(hass).get_parcel_lockers_catalog()
+
+    cache = async_get_catalog_cache(hass)
+    cache.fetched_at = 0
+    aioclient_mock.clear_requests()
+    aioclient_mock.get(PARCEL_LOCKERS_LIST_URL, **revalidation)
+
+    parcel_locker = await InPostApi(hass, max_retries=0).search_parcel_locker(
+        "AJE01BAPP"
+    )
+
+    assert parcel_locker is not None
+    assert aioclient_mock.call_count == 1
+    assert aioclient_mock.mock_calls[0][3] == {"If-None-Match": '"v1"'}
+    assert cache.is_fresh is ("status" in revalidation)
+
+
+def test_compact_catalog_materializes_points(mocked_catalog):
+    """Test compact catalog rows are materialized to the same points as dacite."""
+    catalog = CompactCatalog.from_items(mocked_catalog["items"])
+    restored = CompactCatalog.from_dict(catalog.as_dict())
+
+    expected = from_dict(InPostAirPoint, mocked_catalog["items"][0])
+    assert len(restored) == 1
+    assert restored[0].code == "AJE01BAPP"
+    assert (restored[0].latitude, restored[0].longitude) == (52.83679, 22.20968)
+    assert restored[0].to_point() == expected
+    assert restored.find("AJE01BAPP").index == 0
+    assert restored.find("UNKNOWN") is None
+
+
+def test_compact_catalog_accepts_int_coordinates(point_item):
+    """Test whole number coordinates are stored as float like the decoder does."""
+    item = {**point_item, "l": {"a": 52, "o": 21}}
+    catalog = CompactCatalog.from_items([item])
+
+    assert catalog[0].to_point() == dataclass_decoder(InPostAirPoint)(item)
+    assert type(catalog[0].latitude) is float
+    assert type(catalog[0].longitude) is float
+
+
+@pytest.mark.parametrize(
+    "changes",
+    [
+        {"l": {"a": 52.8}},
+        {"l": {"a": "52.8", "o": 22.2}},
+        {"l": {"a": True, "o": 22.2}},
+        {"l": []},
+        {"q": None},
+        {"t": 1.9},
+        {"s": "1"},
+        {"n": None},
+    ],
+)
+def test_compact_catalog_rejects_malformed_items(changes, mocked_catalog):
+    """Test items the decoder rejects don't leave catalog columns misaligned."""
+    item = {**mocked_catalog["items"][0], **changes}
+    catalog = CompactCatalog()
+
+    with pytest.raises(DecodeError):
+        dataclass_decoder(InPostAirPoint)(item)
+    with pytest.raises(ValueError):
+        catalog.append(item)
+
+    assert len(catalog) == 0
+    assert len(catalog.latitudes) == 0
+
+
+@pytest.mark.parametrize("expected_lingering_timers", [True])
+async def test_unknown_locker_lookup_is_remembered(
+    hass, aioclient_mock, mocked_catalog
+):
+    """Test unknown locker code isn't looked up again in easypack24.net."""
+    aioclient_mock.get(PARCEL_LOCKERS_LIST_URL, json=mocked_catalog)
+    aioclient_mock.get(
+        EASYPACK24_POINTS_URL + "UNKNOWN",
+        status=HTTPStatus.NOT_FOUND,
+        json={"error": "resource_not_found"},
+    )
+    await InPostApi(hass).get_parcel_lockers_catalog()
+
+    assert await InPostApi(hass).search_parcel_locker("UNKNOWN") is None
+    assert await InPostApi(hass).search_parcel_locker("UNKNOWN") is None
+    assert await InPostApi(hass).search_parcel_locker("AJE01BAPP") is not None
+    assert aioclient_mock.call_count == 2
+
+
+@pytest.mark.parametrize("expected_lingering_timers", [True])
+@patch("custom_components.inpost_air.api.CATALOG_PARSE_BATCH_SIZE", 1)
+async def test_catalog_parsed_in_executor(hass, aioclient_mock, mocked_catalog):
+    """Test downloaded catalog is decoded by the executor."""
+    aioclient_mock.get(PARCEL_LOCKERS_LIST_URL, json=mocked_catalog)
+
+    with patch.object(
+        hass, "async_add_executor_job", wraps=hass.async_add_executor_job
+    ) as async_add_executor_job:
+        catalog = await InPostApi(hass).get_parcel_lockers_catalog()
+
+    assert catalog.date == "2024-06-01"
+    assert catalog.find("AJE01BAPP") is not None
+    assert any(
+        call.args[0] is _parse_catalog_batch
+        for call in async_add_executor_job.call_args_list
+    )
+
+
+@pytest.mark.parametrize("expected_lingering_timers", [True])
+@patch("custom_components.inpost_air.api.CATALOG_PARSE_BATCH_SIZE", 1)
+async def test_searched_catalog_parsed_in_executor(
+    hass, aioclient_mock, mocked_catalog
+):
+    """Test catalog streamed by a search is decoded by the executor and kept."""
+    aioclient_mock.get(PARCEL_LOCKERS_LIST_URL, json=mocked_catalog)
+    aioclient_mock.get(EASYPACK24_POINTS_URL + "UNKNOWN", status=HTTPStatus.NOT_FOUND)
+
+    with patch.object(
+        hass, "async_add_executor_job", wraps=hass.async_add_executor_job
+    ) as async_add_executor_job:
+        assert await InPostApi(hass).search_parcel_locker("UNKNOWN") is None
+
+    assert any(
+        call.args[0] is _parse_catalog_batch
+        for call in async_add_executor_job.call_args_list
+    )
+    assert async_get_catalog_cache(hass).catalog.find("AJE01BAPP") is not None
+
+
+@pytest.mark.parametrize("expected_lingering_timers", [True])
+@patch("custom_components.inpost_air.api.CATALOG_PARSE_BATCH_SIZE", 1)
+async def test_iter_parcel_lockers_filters_streamed_catalog(
+    hass, aioclient_mock, point_item
+):
+    """Test lockers are filtered while the catalog streams, then from cache."""
+    aioclient_mock.get(
+        PARCEL_LOCKERS_LIST_URL,
+        json={"items": [point_item, {**point_item, "n": "KRA01M", "g": "krakow"}]},
+    )
+    api = InPostApi(hass)
+
+    async def codes(predicate):
+        return [point.n async for point in api.iter_parcel_lockers(predicate)]
+
+    assert await codes(lambda row: row.code.startswith("KRA")) == ["KRA01M"]
+    assert await codes(None) == ["AJE01BAPP", "KRA01M"]
+    assert aioclient_mock.call_count == 1
+
+
+async def test_malformed_catalog_is_rejected(hass, aioclient_mock):
+    """Test truncated catalog isn't cached."""
+    aioclient_mock.get(PARCEL_LOCKERS_LIST_URL, text='{"items": [{"n": "AJE01BAPP"')
+
+    with pytest.raises(InPostAirApiClientError):
+        await InPostApi(hass).get_parcel_lockers_catalog()
+
+    assert async_get_catalog_cache(hass).catalog is None
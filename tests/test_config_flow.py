@@ -2,40 +2,28 @@
 
 from unittest import mock
 from unittest.mock import patch
+
+import pytest
+from pytest_homeassistant_custom_component.common import MockConfigEntry
+
 from custom_components.inpost_air import config_flow
-from custom_components.inpost_air.api import InPostApi
-from custom_components.inpost_air.models import (
-    InPostAirPoint,
-    InPostAirPointCoordinates,
+from custom_components.inpost_air.air_index import (
+    AirCapabilityIndex,
+    async_get_air_index,
 )
+from custom_components.inpost_air.api import InPostApi
+from custom_components.inpost_air.catalog import CompactCatalog
+from custom_components.inpost_air.const import CONF_SHARED_POLLING
 
-mocked_lockers_list: list[InPostAirPoint] = [
-    InPostAirPoint(
-        "AJE01BAPP",
-        1,
-        "Market Dino",
-        "",
-        "",
-        "006",
-        "Andrzejewo",
-        "andrzejewo",
-        "Warszawska",
-        "mazowieckie",
-        "07-305",
-        "62A",
-        "24/7",
-        "[]",
-        InPostAirPointCoordinates(52.83679, 22.20968),
-        0,
-        1,
-    ),
-]
-
-
-async def test_flow_init(hass):
+
+async def test_flow_init(hass, point_item):
     """Test the initial flow."""
-    with patch.object(InPostApi, "get_parcel_lockers_list") as get_parcel_lockers_list:
-        get_parcel_lockers_list.return_value = mocked_lockers_list
+    with patch.object(
+        InPostApi, "get_parcel_lockers_catalog"
+    ) as get_parcel_lockers_catalog:
+        get_parcel_lockers_catalog.return_value = CompactCatalog.from_items(
+            [point_item]
+        )
 
         result = await hass.config_entries.flow.async_init(
             config_flow.DOMAIN, context={"source": "user"}
@@ -52,3 +40,92 @@ async def test_flow_init(hass):
         "last_step": None,
         "preview": None,
     } == result
+
+
+async def test_flow_search(hass, point_item):
+    """Test searching parcel lockers re-renders the form with matching lockers."""
+    with patch.object(
+        InPostApi, "get_parcel_lockers_catalog"
+    ) as get_parcel_lockers_catalog:
+        get_parcel_lockers_catalog.return_value = CompactCatalog.from_items(
+            [point_item]
+        )
+
+        result = await hass.config_entries.flow.async_init(
+            config_flow.DOMAIN, context={"source": "user"}
+        )
+        result = await hass.config_entries.flow.async_configure(
+            result["flow_id"], {"search": "Warszawska"}
+        )
+        options = result["data_schema"].schema["parcelLockerId"].config["options"]
+
+        assert result["errors"] == {}
+        assert [option["value"] for option in options] == ["AJE01BAPP"]
+
+        result = await hass.config_entries.flow.async_configure(
+            result["flow_id"], {"search": "Warszawska"}
+        )
+
+        assert result["errors"] == {"base": "parcel_locker_not_selected"}
+
+        result = await hass.config_entries.flow.async_configure(
+            result["flow_id"], {"search": "Kraków"}
+        )
+
+        assert result["errors"] == {"base": "no_parcel_lockers_found"}
+
+
+@pytest.mark.parametrize("expected_lingering_timers", [True])
+async def test_flow_lists_lockers_with_air_data_first(hass, point_item):
+    """Test lockers known to have air data are listed first and marked."""
+    items = [point_item]
+    items.append({**items[0], "n": "AJE02BAPP", "l": {"a": 52.9, "o": 22.3}})
+    items.append({**items[0], "n": "AJE03BAPP", "l": {"a": 53.0, "o": 22.4}})
+    air_index = async_get_air_index(hass)
+    await air_index.async_load()
+    air_index.async_set("AJE01BAPP", False)
+    air_index.async_set("AJE03BAPP", True)
+
+    with (
+        patch.object(
+            InPostApi, "get_parcel_lockers_catalog"
+        ) as get_parcel_lockers_catalog,
+        patch.object(AirCapabilityIndex, "async_probe") as async_probe,
+    ):
+        get_parcel_lockers_catalog.return_value = CompactCatalog.from_items(items)
+
+        result = await hass.config_entries.flow.async_init(
+            config_flow.DOMAIN, context={"source": "user"}
+        )
+
+    options = result["data_schema"].schema["parcelLockerId"].config["options"]
+    assert [option["value"] for option in options] == [
+        "AJE03BAPP",
+        "AJE02BAPP",
+        "AJE01BAPP",
+    ]
+    assert options[0]["label"].startswith("✓ AJE03BAPP")
+    assert options[1]["label"].startswith("AJE02BAPP")
+    assert options[2]["label"].startswith("✗ AJE01BAPP")
+    assert list(async_probe.call_args.args[2]) == [
+        "AJE03BAPP",
+        "AJE02BAPP",
+        "AJE01BAPP",
+    ]
+
+
+async def test_options_flow(hass):
+    """Test shared polling can be turned on in options."""
+    entry = MockConfigEntry(domain=config_flow.DOMAIN, version=2, data={})
+    entry.add_to_hass(hass)
+
+    result = await hass.config_entries.options.async_init(entry.entry_id)
+    assert result["type"] == "form"
+    assert result["step_id"] == "init"
+
+    result = await hass.config_entries.options.async_configure(
+        result["flow_id"], user_input={CONF_SHARED_POLLING: True}
+    )
+
+    assert result["type"] == "create_entry"
+    assert entry.options == {CONF_SHARED_POLLING: True}
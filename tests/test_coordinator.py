@@ -0,0 +1,273 @@
+"""Coordinator tests."""
+
+import asyncio
+from datetime import datetime, timedelta
+from unittest.mock import patch
+
+import pytest
+from homeassistant.helpers import device_registry as dr
+from homeassistant.helpers import entity_registry as er
+from homeassistant.util import dt as dt_util
+from pytest_homeassistant_custom_component.common import (
+    MockConfigEntry,
+    async_fire_time_changed,
+)
+from sqlalchemy.exc import OperationalError
+
+from custom_components.inpost_air.api import InPostApi
+from custom_components.inpost_air.const import DOMAIN, Entities
+from custom_components.inpost_air.coordinator import (
+    UPDATE_INTERVAL,
+    InPostAirDataCoordinator,
+    InPostAirHubCoordinator,
+    ValueWithNorm,
+    ValueWithoutNorm,
+    create_value,
+)
+from custom_components.inpost_air.history import BATCH_DELAY, HistoryFetcher
+from custom_components.inpost_air.models import ParcelLocker
+from custom_components.inpost_air.utils import get_device_info
+
+
+@pytest.mark.parametrize(
+    ("line", "expected"),
+    [
+        ("PM25:10.5:42", ValueWithNorm(Entities.PM2_5, 10.5, 42)),
+        ("PM10:20:40.2", ValueWithNorm(Entities.PM10, 20, 40.2)),
+        ("PM1:3.1:", ValueWithoutNorm(Entities.PM1, 3.1)),
+        ("PM4:4:", ValueWithoutNorm(Entities.PM4, 4)),
+        ("TEMPERATURE:-1.5:", ValueWithoutNorm(Entities.Temperature, -1.5)),
+        ("PRESSURE:1013.2:", ValueWithoutNorm(Entities.Pressure, 1013.2)),
+        ("HUMIDITY:80:", ValueWithoutNorm(Entities.Humidity, 80)),
+        ("NO2:12:", ValueWithoutNorm(Entities.NO2, 12)),
+        ("O3:50.5:", ValueWithoutNorm(Entities.O3, 50.5)),
+        ("PM25:10.5:", ValueWithoutNorm(Entities.PM2_5, 10.5)),
+        ("SO2:-3:7", ValueWithNorm("SO2", -3, 7)),
+        ("HUMIDITY:-80:", None),
+        ("PM10:abc:40", None),
+        ("PM10", None),
+        ("", None),
+    ],
+)
+def test_create_value(line, expected):
+    """Test air sensors lines are parsed according to their specs."""
+    assert create_value(line) == expected
+
+
+def test_create_value_reports_unknown_sensor(caplog):
+    """Test unknown sensors are reported instead of dropped silently."""
+    create_value("CO:0.4:")
+
+    assert "Unknown air sensor reported by InPost: CO:0.4:" in caplog.text
+
+
+def create_pm25_entity(hass, parcel_locker: ParcelLocker) -> str:
+    """Register PM2.5 sensor of the parcel locker."""
+    entry = MockConfigEntry(domain=DOMAIN)
+    entry.add_to_hass(hass)
+    device = dr.async_get(hass).async_get_or_create(
+        config_entry_id=entry.entry_id,
+        identifiers=get_device_info(parcel_locker)["identifiers"],
+    )
+    return (
+        er.async_get(hass)
+        .async_get_or_create(
+            "sensor",
+            DOMAIN,
+            f"{parcel_locker.locker_code}_PM25",
+            device_id=device.id,
+            translation_key="pm25",
+        )
+        .entity_id
+    )
+
+
+async def async_seed(hass, parcel_locker: ParcelLocker) -> InPostAirDataCoordinator:
+    """Create coordinator and seed its rolling means."""
+    coordinator = InPostAirDataCoordinator(hass, InPostApi(hass), parcel_locker)
+    seed = asyncio.gather(
+        coordinator.async_seed_aggregator(), coordinator.async_seed_aggregator()
+    )
+    # Let batched history queries run until seed is complete
+    while not seed.done():
+        await asyncio.sleep(0)
+        async_fire_time_changed(hass, dt_util.utcnow() + timedelta(seconds=BATCH_DELAY))
+    await seed
+    return coordinator
+
+
+def patch_recorder(
+    states: dict[str, list[tuple[datetime, float]]],
+    statistics: dict[str, list[tuple[datetime, float]]],
+    start_time_state: bool = True,
+):
+    """
+    Patch recorder queries of the history fetcher to return given data.
+
+    Results don't depend on recorder runs of the Home Assistant version under
+    test. Hourly statistics are returned for the "hour" period only.
+    """
+
+    def fetch_states(self, entity_ids, start_time, end_time):
+        results = {}
+        for entity_id in entity_ids & states.keys():
+            rows = [(time.timestamp(), value) for time, value in states[entity_id]]
+            earlier = [
+                value
+                for timestamp, value in rows
+                if timestamp <= start_time.timestamp()
+            ]
+            results[entity_id] = [
+                *(
+                    [(start_time.timestamp(), earlier[-1])]
+                    if start_time_state and earlier
+                    else []
+                ),
+                *(
+                    row
+                    for row in rows
+                    if start_time.timestamp() < row[0] <= end_time.timestamp()
+                ),
+            ]
+        return results
+
+    def fetch_statistics(self, entity_ids, start_time, end_time, period):
+        if period != "hour":
+            return {}
+        return {
+            entity_id: [
+                (time.timestamp(), mean)
+                for time, mean in statistics[entity_id]
+                if start_time <= time and time + timedelta(hours=1) <= end_time
+            ]
+            for entity_id in entity_ids & statistics.keys()
+        }
+
+    return patch.multiple(
+        HistoryFetcher, _fetch_states=fetch_states, _fetch_statistics=fetch_statistics
+    )
+
+
+async def test_aggregator_seeded_from_recorder(hass, freezer):
+    """Test rolling means are filled with measurements recorded before setup."""
+    parcel_locker = ParcelLocker("AJE01BAPP", "56311")
+    entity_id = create_pm25_entity(hass, parcel_locker)
+    now = datetime(2024, 6, 1, 12, 30, tzinfo=dt_util.UTC)
+    freezer.move_to(now)
+
+    states = {
+        entity_id: [(now - timedelta(hours=2), 10), (now - timedelta(hours=1), 20)]
+    }
+    with patch_recorder(states, {}):
+        coordinator = await async_seed(hass, parcel_locker)
+
+    timestamp = now.timestamp()
+    assert coordinator.aggregator.mean(Entities.PM2_5, 24, timestamp) == 15
+    assert coordinator.aggregator.mean(Entities.PM2_5, 1, timestamp) == 20
+    assert coordinator.aggregator.mean(Entities.PM10, 24, timestamp) is None
+
+
+async def test_aggregator_seeded_from_statistics(hass, freezer):
+    """Test compiled statistics are used, raw states only after the last of them."""
+    parcel_locker = ParcelLocker("AJE01BAPP", "56311")
+    entity_id = create_pm25_entity(hass, parcel_locker)
+    now = datetime(2024, 6, 1, 12, 30, tzinfo=dt_util.UTC)
+    freezer.move_to(now)
+
+    statistics = {entity_id: [(now.replace(hour=h, minute=0), 10) for h in (7, 8, 9)]}
+    states = {entity_id: [(now.replace(hour=9, minute=30), 20)]}
+    with patch_recorder(states, statistics):
+        coordinator = await async_seed(hass, parcel_locker)
+
+    # 3 hourly means worth 12 samples each, 30 samples since 10:00
+    timestamp = now.timestamp()
+    assert coordinator.aggregator.mean(Entities.PM2_5, 24, timestamp) == pytest.approx(
+        (36 * 10 + 30 * 20) / 66
+    )
+    assert coordinator.aggregator.mean(Entities.PM2_5, 1, timestamp) == 20
+
+
+async def test_aggregator_seeded_without_start_time_state(hass, freezer):
+    """Test windows are seeded from later states if the state at start is missing."""
+    parcel_locker = ParcelLocker("AJE01BAPP", "56311")
+    entity_id = create_pm25_entity(hass, parcel_locker)
+    now = datetime(2024, 6, 1, 12, 30, tzinfo=dt_util.UTC)
+    freezer.move_to(now)
+
+    statistics = {entity_id: [(now.replace(hour=h, minute=0), 10) for h in (7, 8, 9)]}
+    states = {
+        entity_id: [
+            (now.replace(hour=9, minute=30), 20),
+            (now.replace(hour=11, minute=0), 30),
+        ]
+    }
+    with patch_recorder(states, statistics, start_time_state=False):
+        coordinator = await async_seed(hass, parcel_locker)
+
+    # Time between the last statistics and the first state isn't seeded
+    assert coordinator.aggregator.mean(
+        Entities.PM2_5, 24, now.timestamp()
+    ) == pytest.approx((36 * 10 + 18 * 30) / 54)
+
+
+async def test_aggregator_seed_survives_recorder_errors(hass, caplog):
+    """Test recorder errors leave rolling means empty instead of failing setup."""
+    parcel_locker = ParcelLocker("AJE01BAPP", "56311")
+    create_pm25_entity(hass, parcel_locker)
+
+    with patch.object(
+        HistoryFetcher,
+        "_fetch_statistics",
+        side_effect=OperationalError("", {}, None),
+    ):
+        coordinator = await async_seed(hass, parcel_locker)
+
+    assert (
+        coordinator.aggregator.mean(Entities.PM2_5, 24, dt_util.utcnow().timestamp())
+        is None
+    )
+    assert "Couldn't load recorded air quality history" in caplog.text
+
+
+async def test_hub_refreshes_coordinators_on_one_schedule(hass):
+    """Test hub refreshes resolved coordinators with bounded concurrency."""
+    running = 0
+    max_running = 0
+    refreshed = []
+
+    async def get_air_data(self, locker_code, locker_id):
+        nonlocal running, max_running
+        running += 1
+        max_running = max(max_running, running)
+        await asyncio.sleep(0)
+        running -= 1
+        refreshed.append(locker_code)
+        raise ConnectionError
+
+    hub = InPostAirHubCoordinator(hass, max_concurrent_refreshes=2)
+    coordinators = [
+        InPostAirDataCoordinator(
+            hass, InPostApi(hass), ParcelLocker(f"LOCKER{i}", str(i)), None, None
+        )
+        for i in range(5)
+    ]
+    removers = [hub.async_add_coordinator(coordinator) for coordinator in coordinators]
+    removers.pop()()
+    unresolved = InPostAirDataCoordinator(
+        hass, InPostApi(hass), ParcelLocker("UNRESOLVED", None), None, None
+    )
+    removers.append(hub.async_add_coordinator(unresolved))
+
+    with patch.object(InPostApi, "get_parcel_locker_air_data", get_air_data):
+        async_fire_time_changed(hass, dt_util.utcnow() + UPDATE_INTERVAL)
+        await hass.async_block_till_done(wait_background_tasks=True)
+
+    assert sorted(refreshed) == [f"LOCKER{i}" for i in range(4)]
+    assert max_running == 2
+    assert not any(coordinator.last_update_success for coordinator in coordinators[:4])
+
+    for remove in removers:
+        remove()
+    async_fire_time_changed(hass, dt_util.utcnow() + 2 * UPDATE_INTERVAL)
+    await hass.async_block_till_done(wait_background_tasks=True)
+    assert len(refreshed) == 4
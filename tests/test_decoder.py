@@ -0,0 +1,93 @@
+"""Dataclass decoder tests."""
+
+import re
+from dataclasses import dataclass, field
+
+import pytest
+from dacite import from_dict
+
+from custom_components.inpost_air.api import ParcelLockerAirDataResponse
+from custom_components.inpost_air.decoder import DecodeError, dataclass_decoder
+from custom_components.inpost_air.models import InPostAirPoint
+
+
+@dataclass
+class Nested:
+    """Dataclass with optional and list fields."""
+
+    points: list[InPostAirPoint]
+    note: str | None = None
+    tags: list[str] = field(default_factory=list)
+
+
+@pytest.mark.parametrize(
+    ("cls", "make_data"),
+    [
+        (InPostAirPoint, lambda item: item),
+        (InPostAirPoint, lambda item: {**item, "q": 6, "extra": "ignored"}),
+        (InPostAirPoint, lambda item: {**item, "l": {"a": 52, "o": 21}}),
+        (
+            ParcelLockerAirDataResponse,
+            lambda item: {
+                "message": "",
+                "air_index_level": "GOOD",
+                "air_sensors": ["PM1:3:"],
+            },
+        ),
+        (Nested, lambda item: {"points": [item], "note": None}),
+        (Nested, lambda item: {"points": [], "note": "note", "tags": ["a", "b"]}),
+    ],
+)
+def test_decoder_matches_dacite(cls, make_data, point_item):
+    """Test decoded dataclasses are the same as dacite creates."""
+    data = make_data(point_item)
+    assert dataclass_decoder(cls)(data) == from_dict(cls, data)
+
+
+@pytest.mark.parametrize(
+    ("cls", "make_data", "error"),
+    [
+        (
+            InPostAirPoint,
+            lambda item: {**item, "q": 6.5},
+            "wrong type of InPostAirPoint.q",
+        ),
+        (
+            InPostAirPoint,
+            lambda item: {**item, "l": {"a": "52.8", "o": 22.2}},
+            "wrong type of InPostAirPointCoordinates.a",
+        ),
+        (
+            InPostAirPoint,
+            lambda item: {key: value for key, value in item.items() if key != "n"},
+            "missing value of InPostAirPoint.n",
+        ),
+        (InPostAirPoint, lambda item: [], "InPostAirPoint data is list"),
+        (
+            ParcelLockerAirDataResponse,
+            lambda item: {"message": "", "air_index_level": "GOOD", "air_sensors": [1]},
+            "wrong type of ParcelLockerAirDataResponse.air_sensors[]",
+        ),
+        (Nested, lambda item: {"points": [{}]}, "missing value of InPostAirPoint.n"),
+        (
+            Nested,
+            lambda item: {"points": [], "tags": "a"},
+            "wrong type of Nested.tags",
+        ),
+    ],
+)
+def test_decoder_rejects_invalid_data(cls, make_data, error, point_item):
+    """Test data not matching the dataclass is rejected."""
+    with pytest.raises(DecodeError, match=re.escape(error)):
+        dataclass_decoder(cls)(make_data(point_item))
+
+
+def test_decoder_converts_int_to_float(point_item):
+    """Test whole number coordinates accepted by dacite are stored as float."""
+    point = dataclass_decoder(InPostAirPoint)({**point_item, "l": {"a": 52, "o": 21}})
+
+    assert (
+        point.l == from_dict(InPostAirPoint, {**point_item, "l": {"a": 52, "o": 21}}).l
+    )
+    assert type(point.l.a) is float
+    assert type(point.l.o) is float
@@ -0,0 +1,80 @@
+"""Recorder history fetcher tests."""
+
+import asyncio
+from datetime import timedelta
+from unittest.mock import patch
+
+from homeassistant.components.recorder import history
+from homeassistant.util import dt as dt_util
+from pytest_homeassistant_custom_component.common import async_fire_time_changed
+from pytest_homeassistant_custom_component.components.recorder.common import (
+    async_wait_recording_done,
+)
+from sqlalchemy.exc import OperationalError
+
+from custom_components.inpost_air.history import (
+    BATCH_DELAY,
+    HistoryFetchError,
+    async_get_history_fetcher,
+)
+
+
+async def test_concurrent_requests_are_batched(hass, freezer):
+    """Test requests made together share one recorder query."""
+    now = dt_util.utcnow()
+    freezer.move_to(now - timedelta(hours=2))
+    hass.states.async_set("sensor.first", "10")
+    hass.states.async_set("sensor.second", "unavailable")
+    await async_wait_recording_done(hass)
+    freezer.move_to(now - timedelta(hours=1))
+    hass.states.async_set("sensor.first", "20")
+    hass.states.async_set("sensor.second", "5")
+    await async_wait_recording_done(hass)
+    freezer.move_to(now)
+
+    fetcher = async_get_history_fetcher(hass)
+    with patch.object(
+        history,
+        "get_significant_states",
+        wraps=history.get_significant_states,
+    ) as get_significant_states:
+        requests = asyncio.gather(
+            fetcher.async_get_states(["sensor.first"], now - timedelta(hours=3), now),
+            fetcher.async_get_states(
+                ["sensor.second"], now - timedelta(minutes=90), now
+            ),
+        )
+        await asyncio.sleep(0)
+        async_fire_time_changed(hass, now + timedelta(seconds=BATCH_DELAY))
+        first, second = await requests
+
+    assert get_significant_states.call_count == 1
+    two_hours_ago = (now - timedelta(hours=2)).timestamp()
+    one_hour_ago = (now - timedelta(hours=1)).timestamp()
+    assert first == {"sensor.first": [(two_hours_ago, 10), (one_hour_ago, 20)]}
+    assert second == {
+        "sensor.second": [
+            ((now - timedelta(minutes=90)).timestamp(), None),
+            (one_hour_ago, 5),
+        ]
+    }
+
+
+async def test_recorder_errors_are_reported(hass):
+    """Test database errors fail all requests of the batch."""
+    now = dt_util.utcnow()
+    fetcher = async_get_history_fetcher(hass)
+
+    with patch.object(
+        history, "get_significant_states", side_effect=OperationalError("", {}, None)
+    ):
+        requests = asyncio.gather(
+            fetcher.async_get_states(["sensor.first"], now - timedelta(hours=1), now),
+            fetcher.async_get_states(["sensor.second"], now - timedelta(hours=1), now),
+            return_exceptions=True,
+        )
+        await asyncio.sleep(0)
+        async_fire_time_changed(hass, now + timedelta(seconds=BATCH_DELAY))
+        results = await requests
+
+    assert all(isinstance(result, HistoryFetchError) for result in results)
@@ -0,0 +1,347 @@
+"""Integration setup tests."""
+
+import asyncio
+from dataclasses import asdict, replace
+from unittest.mock import patch
+
+from homeassistant.config_entries import ConfigEntryState
+from homeassistant.const import STATE_UNAVAILABLE
+from homeassistant.helpers import entity_registry as er
+from homeassistant.util import dt as dt_util
+from pytest_homeassistant_custom_component.common import (
+    MockConfigEntry,
+    async_fire_time_changed,
+)
+
+from custom_components.inpost_air import LOCKER_ID_REVALIDATION_INTERVAL
+from custom_components.inpost_air.api import InPostApi, async_get_api_client
+from custom_components.inpost_air.const import (
+    CONF_LOCKER_ID,
+    CONF_LOCKER_ID_VERIFIED_AT,
+    DOMAIN,
+)
+from custom_components.inpost_air.coordinator import UPDATE_INTERVAL
+
+AIR_DATA_URL = "https://inpost.pl/shipx-point-data/56311/AJE01BAPP/air_index_level"
+
+mocked_air_data = {
+    "message": "",
+    "air_index_level": "GOOD",
+    "air_sensors": [
+        "PM25:10.5:42",
+        "PM10:20.1:40.2",
+        "TEMPERATURE:-1.5:",
+        "HUMIDITY:80:",
+    ],
+}
+
+
+async def async_finish_background_setup(hass) -> None:
+    """Run first refresh delayed to spread requests of parcel lockers."""
+    async_fire_time_changed(hass, dt_util.utcnow() + UPDATE_INTERVAL)
+    await hass.async_block_till_done(wait_background_tasks=True)
+
+
+def create_entry(hass, point, **data) -> MockConfigEntry:
+    """Create config entry for the parcel locker."""
+    entry = MockConfigEntry(
+        domain=DOMAIN,
+        version=2,
+        unique_id=point.n,
+        title=f"Parcel locker {point.n}",
+        data={"parcel_locker": asdict(point), **data},
+    )
+    entry.add_to_hass(hass)
+    return entry
+
+
+async def test_setup_uses_stored_locker_id(hass, aioclient_mock, mocked_point):
+    """Test setup doesn't scrape parcel locker page when ID is stored."""
+    aioclient_mock.post(AIR_DATA_URL, json=mocked_air_data)
+    entry = create_entry(
+        hass,
+        mocked_point,
+        **{
+            CONF_LOCKER_ID: "56311",
+            CONF_LOCKER_ID_VERIFIED_AT: dt_util.utcnow().timestamp() - 86400,
+        },
+    )
+
+    with patch.object(
+        InPostApi, "find_parcel_locker_id", return_value="56311"
+    ) as find_parcel_locker_id:
+        assert await hass.config_entries.async_setup(entry.entry_id)
+        await hass.async_block_till_done()
+
+    assert entry.state is ConfigEntryState.LOADED
+    assert entry.runtime_data.parcel_locker.locker_id == "56311"
+    assert find_parcel_locker_id.await_count == 0
+
+    assert await hass.config_entries.async_unload(entry.entry_id)
+    await hass.async_block_till_done()
+
+
+async def test_setup_stores_resolved_locker_id(hass, aioclient_mock, mocked_point):
+    """Test locker ID resolved during setup is stored in the entry."""
+    aioclient_mock.post(AIR_DATA_URL, json=mocked_air_data)
+    entry = create_entry(hass, mocked_point)
+    started_at = dt_util.utcnow().timestamp()
+
+    with patch.object(InPostApi, "find_parcel_locker_id", return_value="56311"):
+        assert await hass.config_entries.async_setup(entry.entry_id)
+        await hass.async_block_till_done()
+
+    assert entry.state is ConfigEntryState.LOADED
+    assert entry.data[CONF_LOCKER_ID] == "56311"
+    assert entry.data[CONF_LOCKER_ID_VERIFIED_AT] >= started_at
+
+    assert await hass.config_entries.async_unload(entry.entry_id)
+    await hass.async_block_till_done()
+
+
+async def test_stale_locker_id_is_revalidated(hass, aioclient_mock, mocked_point):
+    """Test stored ID verified long ago is checked once after start."""
+    aioclient_mock.post(AIR_DATA_URL, json=mocked_air_data)
+    entry = create_entry(
+        hass,
+        mocked_point,
+        **{
+            CONF_LOCKER_ID: "56311",
+            CONF_LOCKER_ID_VERIFIED_AT: (
+                dt_util.utcnow() - LOCKER_ID_REVALIDATION_INTERVAL
+            ).timestamp(),
+        },
+    )
+
+    started_at = dt_util.utcnow().timestamp()
+
+    with patch.object(
+        InPostApi, "find_parcel_locker_id", return_value="56311"
+    ) as find_parcel_locker_id:
+        assert await hass.config_entries.async_setup(entry.entry_id)
+        await hass.async_block_till_done()
+
+    assert entry.state is ConfigEntryState.LOADED
+    assert find_parcel_locker_id.await_count == 1
+    assert entry.data[CONF_LOCKER_ID_VERIFIED_AT] >= started_at
+
+    assert await hass.config_entries.async_unload(entry.entry_id)
+    await hass.async_block_till_done()
+
+
+async def test_changed_locker_id_reloads_entry(hass, aioclient_mock, mocked_point):
+    """Test entry is reloaded with the new ID when revalidation finds it changed."""
+    aioclient_mock.post(AIR_DATA_URL, json=mocked_air_data)
+    aioclient_mock.post(
+        "https://inpost.pl/shipx-point-data/99999/AJE01BAPP/air_index_level",
+        json=mocked_air_data,
+    )
+    entry = create_entry(hass, mocked_point, **{CONF_LOCKER_ID: "56311"})
+
+    with patch.object(InPostApi, "find_parcel_locker_id", return_value="99999"):
+        # Revalidation reloads the entry while it's still being set up
+        await hass.config_entries.async_setup(entry.entry_id)
+        await hass.async_block_till_done()
+
+    assert entry.state is ConfigEntryState.LOADED
+    assert entry.data[CONF_LOCKER_ID] == "99999"
+    assert entry.runtime_data.parcel_locker.locker_id == "99999"
+
+    assert await hass.config_entries.async_unload(entry.entry_id)
+    await hass.async_block_till_done()
+
+
+def store_snapshot(hass_storage, entry) -> None:
+    """Store snapshot of data fetched a minute ago."""
+    hass_storage[f"{DOMAIN}.{entry.entry_id}.snapshot"] = {
+        "version": 1,
+        "minor_version": 1,
+        "key": f"{DOMAIN}.{entry.entry_id}.snapshot",
+        "data": {
+            "fetched_at": dt_util.utcnow().timestamp() - 60,
+            "values": {"PM25": [12.5, 50], "TEMPERATURE": [-3]},
+            "rolling": {"PM25": {"1": [[0, 1000, 1]]}},
+        },
+    }
+
+
+async def test_setup_restores_snapshot(
+    hass, hass_storage, aioclient_mock, mocked_point
+):
+    """Test entities start with data saved before restart without waiting for API."""
+    aioclient_mock.post(AIR_DATA_URL, json=mocked_air_data)
+    entry = create_entry(hass, mocked_point, **{CONF_LOCKER_ID: "56311"})
+    store_snapshot(hass_storage, entry)
+    api_response = asyncio.Event()
+    get_parcel_locker_air_data = InPostApi.get_parcel_locker_air_data
+
+    async def delayed_air_data(*args):
+        await api_response.wait()
+        return await get_parcel_locker_air_data(*args)
+
+    with (
+        patch.object(InPostApi, "find_parcel_locker_id", return_value="56311"),
+        patch.object(InPostApi, "get_parcel_locker_air_data", delayed_air_data),
+    ):
+        assert await hass.config_entries.async_setup(entry.entry_id)
+        await hass.async_block_till_done()
+
+        assert entry.state is ConfigEntryState.LOADED
+        assert hass.states.get("sensor.parcel_locker_aje01bapp_pm_2_5").state == "12.5"
+        assert (
+            hass.states.get("sensor.parcel_locker_aje01bapp_temperature").state == "-3"
+        )
+
+        api_response.set()
+        await async_finish_background_setup(hass)
+
+    assert hass.states.get("sensor.parcel_locker_aje01bapp_pm_2_5").state == "10.5"
+    assert hass.states.get("sensor.parcel_locker_aje01bapp_temperature").state == "-1.5"
+
+    assert await hass.config_entries.async_unload(entry.entry_id)
+    await hass.async_block_till_done()
+
+
+def register_pm25_sensor(hass, entry) -> None:
+    """Register PM 2.5 sensor as if the entry was set up before."""
+    er.async_get(hass).async_get_or_create(
+        "sensor",
+        DOMAIN,
+        f"{entry.unique_id}_PM25",
+        config_entry=entry,
+        suggested_object_id="parcel_locker_aje01bapp_pm_2_5",
+    )
+
+
+async def test_setup_doesnt_wait_for_api(hass, aioclient_mock, mocked_point):
+    """Test entry set up before is loaded while the first refresh is pending."""
+    aioclient_mock.post(AIR_DATA_URL, json=mocked_air_data)
+    entry = create_entry(hass, mocked_point)
+    register_pm25_sensor(hass, entry)
+    api_response = asyncio.Event()
+
+    async def delayed_locker_id(*args):
+        await api_response.wait()
+        return "56311"
+
+    with patch.object(InPostApi, "find_parcel_locker_id", delayed_locker_id):
+        assert await hass.config_entries.async_setup(entry.entry_id)
+        await hass.async_block_till_done()
+
+        assert entry.state is ConfigEntryState.LOADED
+        state = hass.states.get("sensor.parcel_locker_aje01bapp_pm_2_5")
+        assert state.state == STATE_UNAVAILABLE
+        # Only sensors registered before are added until the entry is reloaded
+        assert hass.states.get("sensor.parcel_locker_aje01bapp_temperature") is None
+
+        api_response.set()
+        await async_finish_background_setup(hass)
+
+    assert entry.data[CONF_LOCKER_ID] == "56311"
+    assert hass.states.get("sensor.parcel_locker_aje01bapp_pm_2_5").state == "10.5"
+
+    assert await hass.config_entries.async_unload(entry.entry_id)
+    await hass.async_block_till_done()
+
+
+async def test_background_setup_fails_without_air_sensors(
+    hass, aioclient_mock, mocked_point
+):
+    """Test entry set up in background ends in error once sensors are missing."""
+    aioclient_mock.post(AIR_DATA_URL, status=404)
+    entry = create_entry(hass, mocked_point, **{CONF_LOCKER_ID: "56311"})
+    register_pm25_sensor(hass, entry)
+
+    with patch.object(InPostApi, "find_parcel_locker_id", return_value="56311"):
+        # Entry is reloaded with blocking setup while it's still being set up
+        await hass.config_entries.async_setup(entry.entry_id)
+        await async_finish_background_setup(hass)
+
+    assert entry.state is ConfigEntryState.SETUP_ERROR
+
+
+async def test_restored_setup_fails_without_air_sensors(
+    hass, hass_storage, aioclient_mock, mocked_point
+):
+    """Test fresh snapshot doesn't keep entry without sensors out of error."""
+    aioclient_mock.post(AIR_DATA_URL, status=404)
+    entry = create_entry(
+        hass,
+        mocked_point,
+        **{
+            CONF_LOCKER_ID: "56311",
+            CONF_LOCKER_ID_VERIFIED_AT: dt_util.utcnow().timestamp(),
+        },
+    )
+    store_snapshot(hass_storage, entry)
+
+    with patch.object(InPostApi, "find_parcel_locker_id", return_value="56311"):
+        await hass.config_entries.async_setup(entry.entry_id)
+        await async_finish_background_setup(hass)
+
+    assert entry.state is ConfigEntryState.SETUP_ERROR
+    # One request by the background refresh, one by the blocking setup
+    assert aioclient_mock.call_count == 2
+
+
+async def test_missing_air_sensors_revalidate_locker_id(
+    hass, aioclient_mock, mocked_point
+):
+    """Test setup retries with the new ID when air data of the stored one is gone."""
+    aioclient_mock.post(AIR_DATA_URL, status=404)
+    entry = create_entry(
+        hass,
+        mocked_point,
+        **{
+            CONF_LOCKER_ID: "56311",
+            CONF_LOCKER_ID_VERIFIED_AT: dt_util.utcnow().timestamp() - 86400,
+        },
+    )
+
+    with patch.object(
+        InPostApi, "find_parcel_locker_id", return_value="99999"
+    ) as find_parcel_locker_id:
+        await hass.config_entries.async_setup(entry.entry_id)
+        await hass.async_block_till_done()
+
+    assert entry.state is ConfigEntryState.SETUP_RETRY
+    assert find_parcel_locker_id.await_count == 1
+    assert entry.data[CONF_LOCKER_ID] == "99999"
+
+
+async def test_entries_share_api_client(hass, aioclient_mock, mocked_point):
+    """Test entries use one API client, released only by the last unload."""
+    other_point = replace(mocked_point, n="AJE02BAPP")
+    aioclient_mock.post(AIR_DATA_URL, json=mocked_air_data)
+    aioclient_mock.post(
+        "https://inpost.pl/shipx-point-data/56312/AJE02BAPP/air_index_level",
+        json=mocked_air_data,
+    )
+    verified_at = dt_util.utcnow().timestamp()
+    entries = [
+        create_entry(
+            hass,
+            point,
+            **{CONF_LOCKER_ID: locker_id, CONF_LOCKER_ID_VERIFIED_AT: verified_at},
+        )
+        for point, locker_id in ((mocked_point, "56311"), (other_point, "56312"))
+    ]
+
+    with patch.object(InPostApi, "async_close") as async_close:
+        # Sets up all entries of the integration
+        assert await hass.config_entries.async_setup(entries[0].entry_id)
+        await hass.async_block_till_done()
+        assert entries[1].state is ConfigEntryState.LOADED
+
+        api_client = async_get_api_client(hass)
+        assert all(
+            entry.runtime_data.coordinator.api_client is api_client for entry in entries
+        )
+
+        assert await hass.config_entries.async_unload(entries[0].entry_id)
+        assert async_close.call_count == 0
+        assert async_get_api_client(hass) is api_client
+
+        assert await hass.config_entries.async_unload(entries[1].entry_id)
+        assert async_close.call_count == 1
+        assert async_get_api_client(hass) is not api_client
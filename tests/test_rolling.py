@@ -0,0 +1,86 @@
+"""Rolling means tests."""
+
+import pytest
+
+from custom_components.inpost_air.const import Entities
+from custom_components.inpost_air.rolling import (
+    AirQualityAggregator,
+    RollingMean,
+    replay_states,
+)
+
+
+def test_rolling_mean_evicts_expired_samples():
+    """Test samples leave the mean once they fall out of the window."""
+    rolling_mean = RollingMean(3600, buckets=12)
+
+    rolling_mean.add(0, 10)
+    rolling_mean.add(1800, 20)
+
+    assert rolling_mean.mean(1800) == 15
+    assert rolling_mean.mean(3600 + 300) == 20
+    assert rolling_mean.mean(3600 + 2100) is None
+
+
+def test_rolling_mean_accepts_samples_out_of_order():
+    """Test older samples added after newer ones, like recorder seed, are kept."""
+    rolling_mean = RollingMean(3600, buckets=12)
+
+    rolling_mean.add(7200, 30, weight=2)
+    rolling_mean.add(5400, 0)
+    rolling_mean.add(0, 1000)
+
+    assert rolling_mean.mean(7200) == 20
+
+
+def test_rolling_mean_after_long_gap():
+    """Test whole window is cleared when no samples came for a long time."""
+    rolling_mean = RollingMean(3600, buckets=12)
+    rolling_mean.add(0, 10)
+
+    assert rolling_mean.mean(10 * 86400) is None
+
+    rolling_mean.add(10 * 86400, 5)
+    assert rolling_mean.mean(10 * 86400) == 5
+
+
+def test_aggregator_windows():
+    """Test measurements are averaged separately for every window."""
+    aggregator = AirQualityAggregator()
+
+    aggregator.add_values({Entities.PM10: 40, Entities.NO2: None}, 0)
+    aggregator.add_values({Entities.PM10: 20, Entities.Humidity: 80}, 7200)
+
+    assert aggregator.mean(Entities.PM10, 1, 7200) == 20
+    assert aggregator.mean(Entities.PM10, 24, 7200) == 30
+    assert aggregator.mean(Entities.NO2, 1, 7200) is None
+    assert aggregator.mean(Entities.Humidity, 1, 7200) is None
+
+
+@pytest.mark.parametrize(
+    ("states", "expected"),
+    [
+        ([(0, 10)], [(0, 10, 1), (300, 10, 1), (600, 10, 0.5)]),
+        ([(0, 10), (300, 20)], [(0, 10, 1), (300, 20, 1), (600, 20, 0.5)]),
+        ([(0, 10), (300, None)], [(0, 10, 1)]),
+        ([], []),
+    ],
+)
+def test_replay_states(states, expected):
+    """Test recorded changes are repeated every interval until the next one."""
+    assert list(replay_states(states, 750, 300)) == expected
+
+
+def test_aggregator_restored_from_dict():
+    """Test windows saved with as_dict are restored with the same means."""
+    aggregator = AirQualityAggregator()
+    aggregator.add_values({Entities.PM10: 40, Entities.O3: 80}, 0)
+    aggregator.add_values({Entities.PM10: 20}, 7200)
+
+    restored = AirQualityAggregator()
+    restored.restore({**aggregator.as_dict(), "SO2": {"1": [[0, 1, 1]]}})
+
+    for pollutant, hours in ((Entities.PM10, 1), (Entities.PM10, 24), (Entities.O3, 8)):
+        assert restored.mean(pollutant, hours, 7200) == aggregator.mean(
+            pollutant, hours, 7200
+        )
@@ -0,0 +1,25 @@
+"""Parcel lockers text search tests."""
+
+from custom_components.inpost_air.search import SubstringIndex, normalize
+
+
+def test_normalize():
+    """Test text is lowercased and stripped of diacritics."""
+    assert normalize("Łódź Żeromskiego") == "lodz zeromskiego"
+
+
+def test_substring_index():
+    """Test texts containing the query are found once each."""
+    index = SubstringIndex(
+        [
+            "AJE01BAPP andrzejewo Warszawska",
+            "WAW01M warszawa Złota",
+            "KRA01A kraków Warszawska",
+        ]
+    )
+
+    assert list(index.search("warszaw")) == [0, 1, 2]
+    assert list(index.search("ZLOTA")) == [1]
+    assert list(index.search("krakow")) == [2]
+    assert list(index.search("a\nw")) == []
+    assert list(index.search("   ")) == []
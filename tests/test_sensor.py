@@ -0,0 +1,106 @@
+"""Sensor tests."""
+
+from dataclasses import asdict
+from datetime import timedelta
+
+import pytest
+from homeassistant.const import STATE_UNAVAILABLE
+from homeassistant.util import dt as dt_util
+from pytest_homeassistant_custom_component.common import (
+    MockConfigEntry,
+    async_fire_time_changed,
+)
+
+from custom_components.inpost_air.api import async_get_api_client
+from custom_components.inpost_air.const import (
+    CONF_LOCKER_ID,
+    CONF_LOCKER_ID_VERIFIED_AT,
+    DOMAIN,
+)
+from custom_components.inpost_air.coordinator import UPDATE_INTERVAL
+
+AIR_DATA_URL = "https://inpost.pl/shipx-point-data/56311/AJE01BAPP/air_index_level"
+PAQI_ENTITY_ID = "sensor.parcel_locker_aje01bapp_polish_air_quality_index"
+EAQI_ENTITY_ID = "sensor.parcel_locker_aje01bapp_european_air_quality_index"
+PM25_ENTITY_ID = "sensor.parcel_locker_aje01bapp_pm_2_5"
+
+
+def air_data(pm25: float) -> dict:
+    """Create air data response with given PM2.5 value."""
+    return {
+        "message": "",
+        "air_index_level": "GOOD",
+        "air_sensors": [f"PM25:{pm25}:42", "PM10:15:30"],
+    }
+
+
+@pytest.fixture
+async def entry(hass, aioclient_mock, mocked_point):
+    """Set up entry of the mocked parcel locker."""
+    aioclient_mock.post(AIR_DATA_URL, json=air_data(10.5))
+    entry = MockConfigEntry(
+        domain=DOMAIN,
+        version=2,
+        unique_id=mocked_point.n,
+        title=f"Parcel locker {mocked_point.n}",
+        data={
+            "parcel_locker": asdict(mocked_point),
+            CONF_LOCKER_ID: "56311",
+            CONF_LOCKER_ID_VERIFIED_AT: dt_util.utcnow().timestamp(),
+        },
+    )
+    entry.add_to_hass(hass)
+    assert await hass.config_entries.async_setup(entry.entry_id)
+    await hass.async_block_till_done()
+
+    yield entry
+
+    assert await hass.config_entries.async_unload(entry.entry_id)
+    await hass.async_block_till_done()
+
+
+async def async_poll(hass, freezer, aioclient_mock, **response) -> None:
+    """Let the coordinator poll air data returning the response."""
+    aioclient_mock.clear_requests()
+    aioclient_mock.post(AIR_DATA_URL, **response)
+    freezer.tick(UPDATE_INTERVAL)
+    async_fire_time_changed(hass, dt_util.utcnow())
+    await hass.async_block_till_done()
+
+
+async def test_air_quality_index_isnt_polled(hass, entry):
+    """Test index sensors are updated by the coordinator, not polled."""
+    for entity_id in (PAQI_ENTITY_ID, EAQI_ENTITY_ID):
+        entity = hass.data["entity_components"]["sensor"].get_entity(entity_id)
+        assert entity.should_poll is False
+
+    assert hass.states.get(PAQI_ENTITY_ID).state == "VERY_GOOD"
+    assert hass.states.get(EAQI_ENTITY_ID).state == "FAIR"
+
+
+async def test_air_quality_index_recalculated_on_update(
+    hass, entry, freezer, aioclient_mock
+):
+    """Test index follows rolling means once new data is fetched."""
+    freezer.tick(timedelta(hours=2))
+    await async_poll(hass, freezer, aioclient_mock, json=air_data(60))
+
+    assert hass.states.get(PM25_ENTITY_ID).state == "60.0"
+    assert hass.states.get(PAQI_ENTITY_ID).state == "SUFFICIENT"
+
+
+async def test_air_quality_index_kept_after_failed_poll(
+    hass, entry, freezer, aioclient_mock
+):
+    """Test index keeps its value while rolling means exist, measurements don't."""
+    async_get_api_client(hass).max_retries = 0
+    await async_poll(hass, freezer, aioclient_mock, status=500)
+
+    assert hass.states.get(PM25_ENTITY_ID).state == STATE_UNAVAILABLE
+    assert hass.states.get(PAQI_ENTITY_ID).state == "VERY_GOOD"
+
+    # Measurements fall out of the 1 hour window used by the Polish index
+    freezer.tick(timedelta(hours=1))
+    await async_poll(hass, freezer, aioclient_mock, status=500)
+
+    assert hass.states.get(PAQI_ENTITY_ID).state == STATE_UNAVAILABLE
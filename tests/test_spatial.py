@@ -0,0 +1,49 @@
+"""Spatial index tests."""
+
+import random
+
+import pytest
+
+from custom_components.inpost_air.spatial import GridIndex
+from custom_components.inpost_air.utils import haversine
+
+rng = random.Random(1)
+latitudes = [rng.uniform(49.0, 54.8) for _ in range(2000)]
+longitudes = [rng.uniform(14.1, 24.1) for _ in range(2000)]
+index = GridIndex(latitudes, longitudes)
+
+
+def brute_force(latitude, longitude):
+    """Get distances to all points sorted by distance."""
+    return sorted(
+        (haversine(longitude, latitude, lon, lat), row)
+        for row, (lat, lon) in enumerate(zip(latitudes, longitudes, strict=True))
+    )
+
+
+@pytest.mark.parametrize(
+    ("latitude", "longitude", "k"),
+    [(52.23, 21.01, 1), (52.23, 21.01, 25), (50.06, 19.94, 100), (0.0, 0.0, 5)],
+)
+def test_nearest(latitude, longitude, k):
+    """Test k nearest points are the same as with brute force search."""
+    expected = brute_force(latitude, longitude)[:k]
+
+    assert [row for _, row in index.nearest(latitude, longitude, k)] == [
+        row for _, row in expected
+    ]
+
+
+def test_nearest_all():
+    """Test all points are ranked when k isn't given."""
+    assert len(index.nearest(52.23, 21.01)) == len(latitudes)
+
+
+@pytest.mark.parametrize("radius", [0.5, 10, 75])
+def test_within(radius):
+    """Test points within radius are the same as with brute force search."""
+    expected = [item for item in brute_force(52.23, 21.01) if item[0] <= radius]
+
+    assert [row for _, row in index.within(52.23, 21.01, radius)] == [
+        row for _, row in expected
+    ]
@@ -0,0 +1,76 @@
+"""Streaming JSON parser tests."""
+
+import json
+
+import pytest
+from pytest_homeassistant_custom_component.test_util.aiohttp import mock_stream
+
+from custom_components.inpost_air.api import SHIPX_URL_MAX_LENGTH, SHIPX_URL_PATTERN
+from custom_components.inpost_air.streaming import (
+    JsonArrayItemsParser,
+    async_search_stream,
+)
+
+document = json.dumps(
+    {
+        "date": "2024-06-01",
+        "page": 1,
+        "total_pages": 1,
+        "items": [
+            {"n": "AJE01BAPP", "d": "Zażółć gęślą jaźń"},
+            {"n": "KUKU01BAPP", "d": "Kuków U Żurka", "l": {"a": 49.7, "o": 19.4}},
+        ],
+    },
+    ensure_ascii=False,
+).encode()
+
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 64, len(document)])
+def test_parser_handles_any_chunk_boundaries(chunk_size):
+    """Test items are decoded no matter where chunks are split."""
+    parser = JsonArrayItemsParser("items")
+    items = []
+    for start in range(0, len(document), chunk_size):
+        items.extend(parser.feed(document[start : start + chunk_size]))
+
+    assert parser.done
+    assert parser.header == {"date": "2024-06-01", "page": 1, "total_pages": 1}
+    assert [item["n"] for item in items] == ["AJE01BAPP", "KUKU01BAPP"]
+    assert items[0]["d"] == "Zażółć gęślą jaźń"
+
+
+def test_parser_ignores_data_after_array():
+    """Test parser stops at the end of the array."""
+    parser = JsonArrayItemsParser("items")
+
+    assert parser.feed(b'{"items": [{"n": 1}], "other": [{"n": 2}]}') == [{"n": 1}]
+    assert parser.done
+    assert parser.feed(b"garbage") == []
+
+
+@pytest.mark.parametrize("chunk_size", [1, 5, 16, 4096])
+async def test_search_stream_finds_match_split_between_chunks(chunk_size):
+    """Test pattern is found even if it's split between chunks."""
+    page = (
+        "<html>"
+        + "x" * 100
+        + '<div data-shipx-url="/shipx-point-data/56311/AJE01BAPP/air_index_level">'
+        + "y" * 100
+    ).encode()
+
+    match = await async_search_stream(
+        mock_stream(page), SHIPX_URL_PATTERN, SHIPX_URL_MAX_LENGTH, chunk_size
+    )
+
+    assert match is not None
+    assert match.groups() == ("56311", "AJE01BAPP")
+
+
+async def test_search_stream_without_match():
+    """Test None is returned when pattern isn't in the stream."""
+    assert (
+        await async_search_stream(
+            mock_stream(b"<html></html>"), SHIPX_URL_PATTERN, SHIPX_URL_MAX_LENGTH
+        )
+        is None
+    )
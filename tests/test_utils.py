@@ -1,13 +1,24 @@
 """Utils tests."""
 
-from unittest.mock import Mock
+from unittest.mock import Mock, patch
+
+import pytest
 from custom_components.inpost_air.models import (
     InPostAirPoint,
     InPostAirPointCoordinates,
     ParcelLocker,
 )
 from custom_components.inpost_air.const import DOMAIN
-from custom_components.inpost_air.utils import can_be_float, get_device_info, haversine
+from custom_components.inpost_air.utils import (
+    CircuitBreaker,
+    ExpiringLRUCache,
+    TokenBucket,
+    can_be_float,
+    get_device_info,
+    haversine,
+    haversine_many,
+    stable_fraction,
+)
 from homeassistant.helpers.device_registry import DeviceInfo
 from custom_components.inpost_air.utils import get_parcel_locker_url
 
@@ -36,6 +47,117 @@ def test_haversine():
     )
 
 
+def test_haversine_many():
+    """Test haversine_many function."""
+
+    lons = [-0.1278, 13.4050, 2.3522]
+    lats = [51.5074, 52.5200, 48.8566]
+
+    # Test case: Distances match the single point function
+    assert list(haversine_many(2.3522, 48.8566, lons, lats)) == pytest.approx(
+        [haversine(2.3522, 48.8566, lon, lat) for lon, lat in zip(lons, lats)]
+    )
+
+    # Test case: No points
+    assert len(haversine_many(0, 0, [], [])) == 0
+
+
+def test_expiring_lru_cache():
+    """Test ExpiringLRUCache class."""
+
+    cache = ExpiringLRUCache(maxsize=2, ttl=10)
+
+    with patch("custom_components.inpost_air.utils.time.monotonic") as monotonic:
+        monotonic.return_value = 0
+        cache.set("a", 1)
+        cache.set("b", None, ttl=1)
+
+        # Test case: Negative entries are distinguishable from missing ones
+        assert cache.get("b", "missing") is None
+        assert cache.get("c", "missing") == "missing"
+
+        # Test case: Least recently used entry is evicted
+        cache.get("a")
+        cache.set("c", 3)
+        assert cache.get("b", "missing") == "missing"
+        assert cache.get("a") == 1
+
+        # Test case: Entries expire after their TTL
+        monotonic.return_value = 10
+        assert cache.get("a") is None
+        assert cache.get("c") is None
+
+
+def test_token_bucket():
+    """Test TokenBucket class."""
+
+    with patch("custom_components.inpost_air.utils.time.monotonic") as monotonic:
+        monotonic.return_value = 0
+        bucket = TokenBucket(rate=2, capacity=2)
+
+        # Test case: Burst up to capacity isn't delayed
+        assert bucket.reserve() == 0
+        assert bucket.reserve() == 0
+
+        # Test case: Further calls wait in line
+        assert bucket.reserve() == 0.5
+        assert bucket.reserve() == 1
+
+        # Test case: Tokens refill over time, but not above capacity
+        monotonic.return_value = 11
+        assert bucket.reserve() == 0
+        assert bucket.reserve() == 0
+        assert bucket.reserve() == 0.5
+
+        # Test case: Refunded token is given to the next call
+        bucket.refund()
+        assert bucket.reserve() == 0.5
+
+
+def test_circuit_breaker():
+    """Test CircuitBreaker class."""
+
+    with patch("custom_components.inpost_air.utils.time.monotonic") as monotonic:
+        monotonic.return_value = 0
+        breaker = CircuitBreaker(threshold=2, reset_timeout=60)
+
+        # Test case: Circuit opens after consecutive failures
+        breaker.record_failure()
+        breaker.record_success()
+        breaker.record_failure()
+        assert breaker.allow()
+        breaker.record_failure()
+        assert breaker.is_open
+        assert not breaker.allow()
+
+        # Test case: Single probe is let through after reset timeout
+        monotonic.return_value = 60
+        assert breaker.allow()
+        assert not breaker.allow()
+        breaker.record_failure()
+        monotonic.return_value = 119
+        assert not breaker.allow()
+
+        # Test case: Successful probe closes the circuit
+        monotonic.return_value = 120
+        assert breaker.allow()
+        breaker.record_success()
+        assert not breaker.is_open
+        assert breaker.allow()
+
+
+def test_stable_fraction():
+    """Test stable_fraction function."""
+
+    fractions = [stable_fraction(f"WAW{i:02}M") for i in range(100)]
+
+    assert all(0 <= fraction < 1 for fraction in fractions)
+    assert stable_fraction("WAW01M") == fractions[1]
+    # Keys are spread over the whole range
+    assert min(fractions) < 0.1
+    assert max(fractions) > 0.9
+
+
 def test_can_be_float():
     """Test can_be_float function."""
 
@@ -80,6 +202,12 @@ def test_get_device_info():
     # Test case: Check if the returned DeviceInfo matches the expected DeviceInfo
     assert get_device_info(mock_parcel_locker) == expected_device_info
 
+    # Test case: ID which isn't resolved yet is left out
+    mock_parcel_locker.locker_id = None
+    assert get_device_info(mock_parcel_locker) == DeviceInfo(
+        identifiers={(DOMAIN, "ABC123")}
+    )
+
 
 def test_get_parcel_locker_url():
     """Test get_parcel_locker_url function."""